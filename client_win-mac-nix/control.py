@@ -0,0 +1,68 @@
+import argparse
+import json  # runtime control commands
+import socket  # udp networking
+from time import time
+
+# Change the Raspberry Pi server's settings while it's running, without
+# restarting the camera. Commands go to the heartbeat port (port+1).
+#
+#   python3 control.py status
+#   python3 control.py set gain=3.0 contrast=4 blob_min_threshold=180
+#   python3 control.py set contours=true
+#   python3 control.py set width=640 height=480
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "cmd", choices=["status", "set"], help="status: show settings and stats, set: change settings"
+)
+parser.add_argument(
+    "settings", nargs="*", help="settings to change, eg. gain=3.0 fps=60 contours=true"
+)
+parser.add_argument(
+    "--port", type=int, default=4245, help="server port, default 4245. Commands are sent to port+1 (4246)."
+)
+parser.add_argument(
+    "--server-ip", type=str, default="224.3.0.186", help="ip address of the server, default 224.3.0.186 (udp multicast group)"
+)
+parser.add_argument(
+    "--wait", type=float, default=1.0, help="seconds to wait for replies, default 1.0"
+)
+args = parser.parse_args()
+
+
+def parse_value(value):
+    # numbers and true/false as JSON, anything else as a string
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+command = {"cmd": args.cmd}
+for setting in args.settings:
+    key, sep, value = setting.partition("=")
+    if not sep:
+        parser.error(f"expected key=value, got {setting}")
+    command[key.replace("-", "_")] = parse_value(value)
+
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sock.sendto(json.dumps(command).encode("utf-8"), (args.server_ip, args.port + 1))
+
+# With multicast, every server in the group replies.
+replies = 0
+deadline = time() + args.wait
+while True:
+    remaining = deadline - time()
+    if remaining <= 0:
+        break
+    sock.settimeout(remaining)
+    try:
+        data, addr = sock.recvfrom(4096)
+    except TimeoutError:
+        break
+    replies += 1
+    print(f"{addr[0]}:")
+    print(json.dumps(json.loads(data.decode("utf-8")), indent=2))
+
+if replies == 0:
+    print(f"No reply from {args.server_ip}:{args.port + 1}, is the server running?")
@@ -1,78 +1,214 @@
 from evdev import InputDevice, ecodes
 from time import time
-import glob
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
 import select
+import struct
 
-# Key codes
-F7_KEYCODE = 65
-F8_KEYCODE = 66
-SHIFT_KEYCODE = 42  # Left shift
-SHIFT_KEYCODE_RIGHT = 54  # Right shift
+# Event-driven hotkeys for Linux, straight from /dev/input (works on Wayland
+# and X11). epoll sleeps until a key is pressed or a device is plugged in or
+# unplugged (inotify on /dev/input), so there are no timeout wake-ups and
+# keyboards plugged in later just work.
 
-hotkey_time_f7 = time()
-hotkey_time_f8 = time()
+INPUT_DIR = "/dev/input"
 
-def find_keyboards():
-    """Find all keyboard devices"""
-    keyboards = []
-    for device_path in glob.glob("/dev/input/event*"):
+# Key combos are written like "shift+f7", "ctrl+alt+p"
+MODIFIERS = {
+    "shift": (ecodes.KEY_LEFTSHIFT, ecodes.KEY_RIGHTSHIFT),
+    "ctrl": (ecodes.KEY_LEFTCTRL, ecodes.KEY_RIGHTCTRL),
+    "alt": (ecodes.KEY_LEFTALT, ecodes.KEY_RIGHTALT),
+    "meta": (ecodes.KEY_LEFTMETA, ecodes.KEY_RIGHTMETA),
+}
+MODIFIERS["super"] = MODIFIERS["meta"]
+
+# linux/inotify.h
+IN_ATTRIB = 0x00000004  # permissions changed, udev does this after creating
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len, then name
+
+
+def parse_binding(combo):
+    """Turn "shift+f7" into ((left shift, right shift),), KEY_F7"""
+    *mods, key = combo.lower().replace(" ", "").split("+")
+    try:
+        modifiers = tuple(MODIFIERS[mod] for mod in mods)
+        keycode = ecodes.ecodes[f"KEY_{key.upper()}"]
+    except KeyError as err:
+        raise ValueError(f"Unknown key {err} in hotkey {combo}") from None
+    return modifiers, keycode
+
+
+def inotify_open(path):
+    """Watch a directory for created/deleted files, or None if unsupported"""
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return None
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    mask = IN_CREATE | IN_DELETE | IN_ATTRIB
+    if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def inotify_read(fd):
+    """Yields (mask, filename) for each pending inotify event"""
+    try:
+        data = os.read(fd, 4096)
+    except BlockingIOError:
+        return
+    offset = 0
+    while offset + INOTIFY_EVENT.size <= len(data):
+        _wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        name = data[offset : offset + length].rstrip(b"\0")
+        offset += length
+        yield mask, os.fsdecode(name)
+
+
+class HotkeyEngine:
+    """
+    bindings: list of (combo, callback), eg. [("shift+f7", toggle)]
+    open_device: called with a path, returns something like an evdev
+    InputDevice (fd, path, capabilities(), read(), close()). Pass a fake one
+    for testing, see tools/check_hotkeys.py.
+    """
+
+    def __init__(self, bindings, debounce=0.25, input_dir=INPUT_DIR, open_device=InputDevice):
+        self.bindings = [
+            (*parse_binding(combo), callback) for combo, callback in bindings
+        ]
+        self.debounce = debounce
+        self.input_dir = input_dir
+        self.open_device = open_device
+        self.last_fired = [0.0] * len(self.bindings)
+        self.devices = {}  # fd: device
+        self.paths = {}  # path: fd
+        self.pressed = {}  # fd: set of keycodes held down
+        self.epoll = select.epoll()
+        self.inotify_fd = inotify_open(input_dir)
+        if self.inotify_fd is not None:
+            self.epoll.register(self.inotify_fd, select.EPOLLIN)
+        else:
+            logging.info("inotify unavailable, keyboards plugged in later are ignored")
+
+    def scan(self):
+        for name in sorted(os.listdir(self.input_dir)):
+            if name.startswith("event"):
+                self.add_device(os.path.join(self.input_dir, name))
+
+    def add_device(self, path):
+        if path in self.paths:
+            return
         try:
-            device = InputDevice(device_path)
-            if ecodes.EV_KEY in device.capabilities():
-                keyboards.append(device)
+            device = self.open_device(path)
         except (PermissionError, OSError):
-            continue
-    return keyboards
-
-def hotkey_run(callback=None, multiplier_callback=None):
-    global hotkey_time_f7, hotkey_time_f8
-    
-    keyboards = find_keyboards()
-    if not keyboards:
-        raise RuntimeError("No keyboard devices found!")
-    
-    # Track shift key state for each device
-    shift_pressed = {dev.fd: False for dev in keyboards}
-    
-    # Create a dictionary mapping file descriptors to devices
-    devices = {dev.fd: dev for dev in keyboards}
-    
-    while True:
-        # Wait for events on any keyboard device
-        r, w, x = select.select(devices, [], [], 1.0)  # 1 second timeout
-        
-        for fd in r:
-            device = devices[fd]
-            try:
-                for event in device.read():
-                    if event.type == ecodes.EV_KEY:
-                        # Update shift state
-                        if event.code in (SHIFT_KEYCODE, SHIFT_KEYCODE_RIGHT):
-                            shift_pressed[fd] = (event.value == 1 or event.value == 2)
-                        
-                        # Check for F7 press while shift is held
-                        if event.code == F7_KEYCODE and event.value == 1 and shift_pressed[fd]:
-                            now = time()
-                            if now - hotkey_time_f7 > 0.25:
-                                hotkey_time_f7 = now
-                                callback()
-                        
-                        # Check for F8 press while shift is held
-                        if event.code == F8_KEYCODE and event.value == 1 and shift_pressed[fd]:
-                            now = time()
-                            if now - hotkey_time_f8 > 0.25:
-                                hotkey_time_f8 = now
-                                multiplier_callback()
-            except BlockingIOError:
+            return  # not readable (yet), udev may fix the permissions
+        if ecodes.EV_KEY not in device.capabilities():
+            device.close()
+            return
+        self.devices[device.fd] = device
+        self.paths[path] = device.fd
+        self.pressed[device.fd] = set()
+        self.epoll.register(device.fd, select.EPOLLIN)
+        logging.info(f"Hotkeys: listening to {path}")
+
+    def remove_device(self, path):
+        fd = self.paths.pop(path, None)
+        if fd is None:
+            return
+        device = self.devices.pop(fd)
+        self.pressed.pop(fd)
+        try:
+            self.epoll.unregister(fd)
+        except (OSError, ValueError):
+            pass
+        try:
+            device.close()
+        except OSError:
+            pass
+        logging.info(f"Hotkeys: stopped listening to {path}")
+
+    def handle_key(self, fd, code, value):
+        pressed = self.pressed[fd]
+        if value == 0:  # released
+            pressed.discard(code)
+            return
+        pressed.add(code)  # pressed (1) or held down (2)
+        if value != 1:
+            return
+        for i, (modifiers, keycode, callback) in enumerate(self.bindings):
+            if code != keycode:
+                continue
+            if not all(pressed.intersection(mod) for mod in modifiers):
                 continue
+            now = time()
+            if now - self.last_fired[i] > self.debounce:
+                self.last_fired[i] = now
+                callback()
+
+    def read_device(self, fd):
+        device = self.devices[fd]
+        try:
+            for event in device.read():
+                if event.type == ecodes.EV_KEY:
+                    self.handle_key(fd, event.code, event.value)
+        except BlockingIOError:
+            pass
+        except OSError as err:
+            if err.errno != errno.ENODEV:
+                raise
+            self.remove_device(device.path)  # unplugged
+
+    def read_inotify(self):
+        for mask, name in inotify_read(self.inotify_fd):
+            if not name.startswith("event"):
+                continue
+            path = os.path.join(self.input_dir, name)
+            if mask & IN_DELETE:
+                self.remove_device(path)
+            else:
+                self.add_device(path)
+
+    def process(self, timeout=None):
+        """Handle one batch of events; blocks until there is something to do"""
+        for fd, _mask in self.epoll.poll(-1 if timeout is None else timeout):
+            if fd == self.inotify_fd:
+                self.read_inotify()
+            elif fd in self.devices:
+                self.read_device(fd)
+
+    def run(self):
+        self.scan()
+        if not self.devices:
+            logging.warning("No keyboard devices found yet, waiting for one to be plugged in")
+        while True:
+            self.process()
 
-# # CPU Fix Prompt: This works, but takes 5% CPU and spins up the fans. Need to optimize the loop.
+    def close(self):
+        for path in list(self.paths):
+            self.remove_device(path)
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+        self.epoll.close()
 
-# Ah yes, the busy-waiting loop is inefficient. We can optimize this using select() to wait for events instead of continuously polling. Here's the optimized version:
 
-# # Key changes:
-# Added select.select() to efficiently wait for events instead of busy-waiting
-# Added a 1-second timeout to the select call to prevent complete blocking
-# Created a devices dictionary mapping file descriptors to devices for easier lookup
-# Only process events when select indicates data is available
-# This should dramatically reduce CPU usage as the process will sleep while waiting for keyboard events instead of continuously checking for them. The CPU usage should now be close to 0% when idle.
\ No newline at end of file
+def hotkey_run(callback=None, multiplier_callback=None, bindings=None, debounce=0.25):
+    bindings = bindings or {}
+    engine = HotkeyEngine(
+        [
+            (bindings.get("toggle", "shift+f7"), callback),
+            (bindings.get("multiplier", "shift+f8"), multiplier_callback),
+        ],
+        debounce=debounce,
+    )
+    engine.run()
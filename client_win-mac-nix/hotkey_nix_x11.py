@@ -14,7 +14,8 @@ hotkey_time_f7 = time()
 hotkey_time_f8 = time()
 
 
-def hotkey_run(callback=None, multiplier_callback=None):
+# Always F7/F8 with any modifier; custom bindings aren't supported on X11
+def hotkey_run(callback=None, multiplier_callback=None, bindings=None, debounce=0.25):
     global hotkey_time_f7, hotkey_time_f8
 
     # we tell the X server we want to catch keyPress event
@@ -34,13 +35,13 @@ def hotkey_run(callback=None, multiplier_callback=None):
         # Handle F7 key press
         if (my_event.detail == KEYCODE_F7):
             now = time()
-            if now - hotkey_time_f7 > 0.25:
+            if now - hotkey_time_f7 > debounce:
                 hotkey_time_f7 = now
                 callback()
         
         # Handle F8 key press
         elif (my_event.detail == KEYCODE_F8):
             now = time()
-            if now - hotkey_time_f8 > 0.25:
+            if now - hotkey_time_f8 > debounce:
                 hotkey_time_f8 = now
                 multiplier_callback()
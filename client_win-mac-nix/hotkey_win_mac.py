@@ -10,17 +10,29 @@ def for_canonical(f):
     return lambda k: f(listener.canonical(k))
 
 
-def hotkey_run(callback=None, multiplier_callback=None):
+# "shift+f7" to pynput's "<shift>+<f7>"
+def parse_binding(combo):
+    parts = []
+    for part in combo.lower().replace(" ", "").split("+"):
+        if part in ("meta", "super"):
+            part = "cmd"
+        parts.append(part if len(part) == 1 else f"<{part}>")
+    return keyboard.HotKey.parse("+".join(parts))
+
+
+# pynput only fires a HotKey once per key press, so no debounce is needed
+def hotkey_run(callback=None, multiplier_callback=None, bindings=None, debounce=0.25):
     global listener
+    bindings = bindings or {}
 
-    # Shift-F7 hard-coded for now
+    # Shift-F7 by default
     hotkey_toggle = keyboard.HotKey(
-        [keyboard.Key.shift, keyboard.Key.f7.value],
+        parse_binding(bindings.get("toggle", "shift+f7")),
         callback)
     
-    # Shift-F8 for speed multiplier
+    # Shift-F8 for speed multiplier by default
     hotkey_multiplier = keyboard.HotKey(
-        [keyboard.Key.shift, keyboard.Key.f8.value],
+        parse_binding(bindings.get("multiplier", "shift+f8")),
         multiplier_callback)
 
     listener = keyboard.Listener(
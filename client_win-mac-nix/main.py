@@ -1,7 +1,7 @@
 import platform
 import argparse
 import logging
-from time import time, ctime
+from time import time, ctime, perf_counter
 from dataclasses import dataclass
 import math
 import random
@@ -9,24 +9,12 @@ from collections import deque  # for storing x, y time series
 import socket  # udp networking
 import struct  # binary unpacking
 from threading import Thread
+import atexit
+from philnav_bus import BusWriter, FLAG_MOVED
+from realtime import Deadlines, gc_idle, gc_tick, parse_cpus, realtime_start
 
 print("\n\nCLIENT: Starting PhilNav\n\nWelcome to PhilNav, I'm Phil!\n\nUse --help for more info.\n")
 
-match platform.system():
-    case "Darwin":  # macOS
-        from mouse_mac import getCursorPos, setCursorPos
-        from hotkey_win_mac import hotkey_run
-    case "Windows":
-        from mouse_win import getCursorPos, setCursorPos
-        from hotkey_win_mac import hotkey_run
-    case "Linux":
-        from mouse_nix_uinput import getCursorPos, setCursorPos
-        from hotkey_nix_uinput import hotkey_run
-    case _:
-        raise RuntimeError(
-            f"Platform {platform.system()} not supported (not Win, Mac, or Nix)")
-
-
 # parse command line arguments
 parser = argparse.ArgumentParser()
 parser.add_argument(
@@ -56,6 +44,15 @@ parser.add_argument(
 parser.add_argument(
     "-m", "--multiplier", type=float, default=3.0, help="Speed multiplier value when enabled with Shift-F8, default 3.0"
 )
+parser.add_argument(
+    "--hotkey-toggle", type=str, default="shift+f7", help="hotkey to pause/resume, default shift+f7"
+)
+parser.add_argument(
+    "--hotkey-multiplier", type=str, default="shift+f8", help="hotkey to toggle the speed multiplier, default shift+f8"
+)
+parser.add_argument(
+    "--hotkey-debounce", type=float, default=0.25, help="ignore repeated hotkey presses within N seconds, default 0.25"
+)
 parser.add_argument(
     "--port", type=int, default=4245, help="bind to port, default 4245. Heartbeats use port+1 (4246). If you have a firewall, these ports must be open to send/recv UDP."
 )
@@ -68,12 +65,62 @@ parser.add_argument(
 parser.add_argument(
     "--server-ip", type=str, default="224.3.0.186", help="ip address to send heartbeats to (will wake server), default 224.3.0.186 (udp multicast group). Direct udp requires the server's ip for heartbeats, or disable heartbeats on the server."
 )
+parser.add_argument(
+    "--mouse", type=str, choices=["auto", "null"], default="auto", help="mouse backend, default auto (for your OS). null only records the moves, for testing without a desktop, see tools/loopback_harness.py"
+)
+parser.add_argument(
+    "--publish", type=str, nargs="?", const="philnav", default=None, help="share every sample, raw and filtered, with other programs on this PC through shared memory named PUBLISH, default philnav. See philnav_bus.py for the reader."
+)
+parser.add_argument(
+    "--publish-size", type=int, default=1024, help="with --publish, number of samples kept in shared memory, default 1024"
+)
+parser.add_argument(
+    "--record", type=str, default=None, help="save every received movement (with timestamps) to this file, to tune the settings offline with tune.py"
+)
+parser.add_argument(
+    "--realtime", action="store_true", help="Receive and move the mouse with real-time priority (SCHED_FIFO, Linux), lock memory and only collect garbage when idle, to avoid stutter when the PC is busy. Needs root; falls back to what's permitted."
+)
+parser.add_argument(
+    "--realtime-cpus", type=str, default="", help="with --realtime, pin to these CPU cores, eg. 3 or 2,3. Default any"
+)
+parser.add_argument(
+    "--realtime-priority", type=int, default=10, help="with --realtime, SCHED_FIFO priority 1-99, default 10"
+)
+parser.add_argument(
+    "--realtime-deadline", type=float, default=2.0, help="with --realtime, report packets that take longer than N ms to handle, default 2.0"
+)
 parser.add_argument(
     "--rotate", type=float, default=0, help="rotate mouse movements by N degrees (e.g., 90 for camera on its side), default 0"
 )
 
 args = parser.parse_args()
 
+match "null" if args.mouse == "null" else platform.system():
+    case "null":  # no mouse or hotkeys, for testing
+        from mouse_null import getCursorPos, setCursorPos, set_capture_time
+        hotkey_run = None
+    case "Darwin":  # macOS
+        from mouse_mac import getCursorPos, setCursorPos
+        from hotkey_win_mac import hotkey_run, parse_binding
+    case "Windows":
+        from mouse_win import getCursorPos, setCursorPos
+        from hotkey_win_mac import hotkey_run, parse_binding
+    case "Linux":
+        from mouse_nix_uinput import getCursorPos, setCursorPos
+        from hotkey_nix_uinput import hotkey_run, parse_binding
+    case _:
+        raise RuntimeError(
+            f"Platform {platform.system()} not supported (not Win, Mac, or Nix)")
+if args.mouse != "null":
+    set_capture_time = None
+    # Check the hotkeys here, the hotkey thread can only fail quietly
+    for option, combo in (("--hotkey-toggle", args.hotkey_toggle), ("--hotkey-multiplier", args.hotkey_multiplier)):
+        try:
+            parse_binding(combo)
+        except (ValueError, KeyError) as err:
+            parser.error(f"{option} {combo}: {err}")
+
+
 if args.smooth < 1:
     args.smooth = 1
 
@@ -110,11 +157,14 @@ def toggle_multiplier():
     logging.info(f"Speed multiplier ({args.multiplier}x) {'enabled' if multiplier_enabled else 'disabled'}\n")
 
 
-hotkey_thread = Thread(target=hotkey_run, kwargs={
-    "callback": toggle, 
-    "multiplier_callback": toggle_multiplier
-}, daemon=True)
-hotkey_thread.start()
+if hotkey_run is not None:
+    hotkey_thread = Thread(target=hotkey_run, kwargs={
+        "callback": toggle, 
+        "multiplier_callback": toggle_multiplier,
+        "bindings": {"toggle": args.hotkey_toggle, "multiplier": args.hotkey_multiplier},
+        "debounce": args.hotkey_debounce,
+    }, daemon=True)
+    hotkey_thread.start()
 
 
 # initialize networking
@@ -143,7 +193,7 @@ text_listening = (
     f"Listening on {args.client_ip} for mouse data from Raspberry Pi server..."
 )
 print(ctime() + " - " + text_listening)
-print(f"\nPress Ctrl-C to exit, press Shift-F7 to pause/resume, Shift-F8 to toggle {args.multiplier}x speed multiplier\n")
+print(f"\nPress Ctrl-C to exit, press {args.hotkey_toggle} to pause/resume, {args.hotkey_multiplier} to toggle {args.multiplier}x speed multiplier\n")
 
 
 # Stats for debugging & performance. The goal is 60 frames per second, or
@@ -170,6 +220,8 @@ class phil:
     y_q_smooth = 0
     y_q_long = deque([], smooth_long)
     y_q_long_smooth = 0
+    suppressed = 0  # movements the server held back (its --send-deadzone)
+    keyframes = 0
 
 
 # simple moving average to reduce mouse jitter
@@ -186,6 +238,164 @@ def mouse_move_random():
     setCursorPos(x_new, y_new)  # move mouse cursor
 
 
+# Loss-tolerant transport (server --transport absolute). Instead of a delta,
+# each datagram has the server's accumulated position with a sequence number,
+# plus the previous few samples, newest first:
+#   magic, session, seq, count, keyframe, movements held back so far
+#   (server --send-deadzone), camera capture time, OpenCV processing time
+#   count * (x, y)
+# A lost datagram's movement arrives in the next one, and duplicates or late
+# datagrams are dropped. Keep in sync with server_raspberrypi/main.py.
+ABSOLUTE_MAGIC = b"PNA2"
+ABSOLUTE_HEADER = struct.Struct("<4sIIBBIdd")
+ABSOLUTE_SAMPLE = struct.Struct("<dd")
+ABSOLUTE_MAX_SIZE = ABSOLUTE_HEADER.size + 255 * ABSOLUTE_SAMPLE.size  # --history 255
+
+
+@dataclass
+class absolute:
+    session = None  # changes when the server restarts
+    seq = 0
+    x = 0.0
+    y = 0.0
+    recovered = 0  # samples that were lost, but rebuilt from the history
+    duplicates = 0  # duplicate or late datagrams dropped
+    held = 0  # the server's total of movements held back
+
+
+def absolute_diffs(data):
+    # Returns the (x_diff, y_diff) of every sample since the last one we saw,
+    # oldest first, the movements held back since then, whether it's a
+    # keyframe, the camera capture time and OpenCV processing time.
+    # Returns None for a datagram that was cut short.
+    if len(data) < ABSOLUTE_HEADER.size:
+        return None
+    _magic, session, seq, count, keyframe, held, time_cam, ms_opencv = ABSOLUTE_HEADER.unpack_from(data)
+    if len(data) < ABSOLUTE_HEADER.size + count * ABSOLUTE_SAMPLE.size:
+        return None
+    samples = [
+        ABSOLUTE_SAMPLE.unpack_from(data, ABSOLUTE_HEADER.size + i * ABSOLUTE_SAMPLE.size)
+        for i in range(count)
+    ]
+    if not samples:
+        return [], 0, 0, time_cam, ms_opencv
+    if session != absolute.session:  # (re)started, nothing to move yet
+        absolute.session = session
+        absolute.seq = seq
+        absolute.x, absolute.y = samples[0]
+        absolute.held = held
+        return [], 0, 0, time_cam, ms_opencv
+    if seq <= absolute.seq:
+        absolute.duplicates += 1
+        return [], 0, 0, time_cam, ms_opencv
+
+    missing = seq - absolute.seq
+    absolute.recovered += missing - 1
+    # If more were lost than the history holds, the oldest diff covers the
+    # whole gap. The positions are absolute, so it's still exact.
+    diffs = []
+    for x, y in reversed(samples[: min(missing, count)]):
+        if x != absolute.x or y != absolute.y:  # keyframes repeat the position
+            diffs.append((x - absolute.x, y - absolute.y))
+        absolute.x, absolute.y = x, y
+    absolute.seq = seq
+    held_since, absolute.held = (held - absolute.held) % 2**32, held
+    return diffs, held_since, keyframe, time_cam, ms_opencv
+
+
+# Rotate, smooth and apply the deadzone, then move the mouse cursor. Returns
+# False if the movement was inside the deadzone.
+def rotate(x_diff, y_diff):
+    # Apply rotation if specified
+    if rotation_rad:
+        x_rotated = x_diff * cos_rot - y_diff * sin_rot
+        y_rotated = x_diff * sin_rot + y_diff * cos_rot
+        return x_rotated, y_rotated
+    return x_diff, y_diff
+
+
+def mouse_move(x_diff, y_diff, time_cam=0.0):
+    x_diff, y_diff = rotate(x_diff, y_diff)
+
+    # store recent mouse movements
+    phil.x_q.append(x_diff)
+    phil.x_q_smooth = smooth(phil.x_q)
+    phil.y_q.append(y_diff)
+    phil.y_q_smooth = smooth(phil.y_q)
+    phil.x_q_long.append(x_diff)
+    phil.x_q_long_smooth = smooth(phil.x_q_long)
+    phil.y_q_long.append(y_diff)
+    phil.y_q_long_smooth = smooth(phil.y_q_long)
+
+    # Perform more smoothing the *slower* the mouse is moving.
+    # A slow-moving cursor means the user is trying to precisely
+    # point at something.
+    if x_diff**2 + y_diff**2 < 0.2:  # more smoothing
+        x_smooth = phil.x_q_long_smooth
+        y_smooth = phil.y_q_long_smooth
+    elif x_diff**2 + y_diff**2 < 0.5:  # less smoothing
+        x_smooth = phil.x_q_smooth
+        y_smooth = phil.y_q_smooth
+    else:  # moving fast, no smoothing
+        x_smooth = x_diff
+        y_smooth = y_diff
+
+    # Prevent small jittering when holding mouse cursor still inside deadzone.
+    accel_avg = math.sqrt(phil.x_q_smooth**2 + phil.y_q_smooth**2)
+    if accel_avg > 0 and accel_avg < args.deadzone:
+        if bus is not None:
+            x_cur, y_cur = getCursorPos()
+            bus.write(time_cam, x_diff, y_diff, x_smooth, y_smooth, x_cur, y_cur)
+        return False
+
+    # The Magic Happens Now!
+    x_cur, y_cur = getCursorPos()
+    # I'm moving the Y axis slightly faster because looking left and right
+    # is easier than nodding up and down. Also, monitors are wider than they
+    # are tall.
+    
+    # Apply speed multiplier if enabled
+    multiplier = args.multiplier if multiplier_enabled else 1.0
+    
+    x_new = round(x_cur + x_smooth * args.x_speed * multiplier)
+    y_new = round(y_cur + y_smooth * args.y_speed * multiplier)
+    if set_capture_time is not None:  # --mouse null logs the latency
+        set_capture_time(time_cam)
+    setCursorPos(x_new, y_new)  # move mouse cursor
+    phil.time_last_moved = time()
+    if bus is not None:
+        bus.write(time_cam, x_diff, y_diff, x_smooth, y_smooth, x_new, y_new, FLAG_MOVED)
+    return True
+
+
+# Local output bus for other programs, see philnav_bus.py
+bus = None
+if args.publish:
+    bus = BusWriter(args.publish, args.publish_size)
+    atexit.register(bus.close)
+    print(f"Publishing samples to shared memory {args.publish}\n")
+
+
+# Packet recorder for tune.py: a small header, then one record per movement.
+# The tuner reads it with numpy, keep the two in sync.
+#   receive time, camera capture time, x_diff, y_diff (before --rotate)
+RECORD_MAGIC = b"PNR1"
+RECORD = struct.Struct("<ddff")
+record_file = None
+if args.record:
+    record_file = open(args.record, "wb")
+    record_file.write(RECORD_MAGIC)
+    atexit.register(record_file.close)
+    print(f"Recording movements to {args.record}\n")
+
+
+# --realtime, for the main event loop below (this thread)
+deadlines = None
+if args.realtime:
+    realtime_start(args.realtime_priority, parse_cpus(args.realtime_cpus))
+    deadlines = Deadlines()
+
+
 # Main event loop:
 # 1. Receive mouse delta over UDP
 # 2. Update mouse cursor position
@@ -199,6 +409,8 @@ while True:
     if enabled and (time_iter - phil.time_heartbeat > 3):
         heartbeat()
         phil.time_heartbeat = time_iter
+    if deadlines is not None:
+        gc_tick()  # the last packet is done with
 
     # time-based functionality
     if args.timeout > 0 and time_since_start > args.timeout:
@@ -216,68 +428,62 @@ while True:
         # PhilNav uses x, y as x_diff, y_diff and moves the mouse relative to
         # its current position.
         # https://github.com/opentrack/opentrack/issues/747
-        data, addr = sock.recvfrom(48)
+        # Or, the loss-tolerant absolute transport, see absolute_diffs().
+        data, addr = sock.recvfrom(ABSOLUTE_MAX_SIZE)
     except TimeoutError:
         if enabled and (int(time() - phil.time_start) % 5 == 0):
             logging.info(f"{ctime()} - {text_listening}")
+        if deadlines is not None:
+            gc_idle()  # nothing received for a second
         continue
     else:
-        if not enabled:
+        perf_received = perf_counter()
+        if data[:4] == ABSOLUTE_MAGIC:
+            # Keep track of the position even when paused, otherwise resuming
+            # would move the mouse by everything that happened meanwhile.
+            unpacked = absolute_diffs(data)
+            if unpacked is None:
+                continue
+            diffs, held, keyframe, time_cam, ms_opencv = unpacked
+            a, b = float(held), float(keyframe)
+            phil.suppressed += held
+            phil.keyframes += keyframe
+        elif len(data) == 48:
+            # Using OpenTrack protocol, but PhilNav uses:
+            #  x_diff, y_diff, movements held back since the last packet,
+            #  keyframe, camera capture time, OpenCV processing time
+            # The middle two are 0 unless the server uses --send-deadzone.
+            x_diff, y_diff, a, b, time_cam, ms_opencv = struct.unpack(
+                "dddddd", data)
+            phil.suppressed += int(a)
+            if b == 1.0:
+                phil.keyframes += 1
+            # a keyframe while holding still, nothing to move
+            diffs = [(x_diff, y_diff)] if x_diff or y_diff else []
+        else:
             continue
 
-        # Using OpenTrack protocol, but PhilNav uses:
-        #  x_diff, y_diff, n/a, n/a, camera capture time, OpenCV processing time
-        x_diff, y_diff, a, b, time_cam, ms_opencv = struct.unpack(
-            "dddddd", data)
-
-        # Apply rotation if specified
-        if rotation_rad:
-            x_rotated = x_diff * cos_rot - y_diff * sin_rot
-            y_rotated = x_diff * sin_rot + y_diff * cos_rot
-            x_diff = x_rotated
-            y_diff = y_rotated
-
-        # store recent mouse movements
-        phil.x_q.append(x_diff)
-        phil.x_q_smooth = smooth(phil.x_q)
-        phil.y_q.append(y_diff)
-        phil.y_q_smooth = smooth(phil.y_q)
-        phil.x_q_long.append(x_diff)
-        phil.x_q_long_smooth = smooth(phil.x_q_long)
-        phil.y_q_long.append(y_diff)
-        phil.y_q_long_smooth = smooth(phil.y_q_long)
-
-        # Perform more smoothing the *slower* the mouse is moving.
-        # A slow-moving cursor means the user is trying to precisely
-        # point at something.
-        if x_diff**2 + y_diff**2 < 0.2:  # more smoothing
-            x_smooth = phil.x_q_long_smooth
-            y_smooth = phil.y_q_long_smooth
-        elif x_diff**2 + y_diff**2 < 0.5:  # less smoothing
-            x_smooth = phil.x_q_smooth
-            y_smooth = phil.y_q_smooth
-        else:  # moving fast, no smoothing
-            x_smooth = x_diff
-            y_smooth = y_diff
-
-        # Prevent small jittering when holding mouse cursor still inside deadzone.
-        accel_avg = math.sqrt(phil.x_q_smooth**2 + phil.y_q_smooth**2)
-        if accel_avg > 0 and accel_avg < args.deadzone:
+        if not diffs:
+            continue
+        if not enabled:
+            # Paused with the hotkey, but other programs still get the
+            # samples (unfiltered, and the cursor doesn't move)
+            if bus is not None:
+                x_cur, y_cur = getCursorPos()
+                for x_diff, y_diff in diffs:
+                    x_diff, y_diff = rotate(x_diff, y_diff)
+                    bus.write(time_cam, x_diff, y_diff, 0.0, 0.0, x_cur, y_cur)
             continue
 
-        # The Magic Happens Now!
-        x_cur, y_cur = getCursorPos()
-        # I'm moving the Y axis slightly faster because looking left and right
-        # is easier than nodding up and down. Also, monitors are wider than they
-        # are tall.
-        
-        # Apply speed multiplier if enabled
-        multiplier = args.multiplier if multiplier_enabled else 1.0
-        
-        x_new = round(x_cur + x_smooth * args.x_speed * multiplier)
-        y_new = round(y_cur + y_smooth * args.y_speed * multiplier)
-        setCursorPos(x_new, y_new)  # move mouse cursor
-        phil.time_last_moved = time()
+        moved = False
+        for x_diff, y_diff in diffs:
+            if record_file is not None:
+                record_file.write(RECORD.pack(time(), time_cam, x_diff, y_diff))
+            moved = mouse_move(x_diff, y_diff, time_cam) or moved
+        if deadlines is not None:
+            deadlines.check((perf_counter() - perf_received) * 1000, args.realtime_deadline)
+        if not moved:
+            continue
 
         # I'm trying to measure the total time from capturing the frame on the
         # camera to moving the mouse cursor on my PC. This isn't super accurate.
@@ -294,8 +500,20 @@ while True:
             # display legend every 5 seconds
             if phil.debug_num % 5 == 1:
                 logging.info(
-                    f"{now_str} - Received: ({'x_diff':>8},{'y_diff':>8})  ,{'n/a':>8},{'n/a':>8},{'time ms':>8},{'time cv':>8}"
+                    f"{now_str} - Received: ({'x_diff':>8},{'y_diff':>8})  ,{'held':>8},{'key':>8},{'time ms':>8},{'time cv':>8}"
                 )
             logging.info(
                 f"{now_str} - Received: ({x_diff:> 8.2f},{y_diff:> 8.2f})  ,{a:> 8.2f},{b:> 8.2f},{ms_time_diff:>8},{ms_opencv:>8.2f}"
             )
+            if deadlines is not None:
+                logging.info(
+                    f"{now_str} - Realtime: {deadlines.missed} of {deadlines.checked} packets over {args.realtime_deadline}ms (worst {deadlines.worst_ms:.1f}ms)"
+                )
+            if phil.suppressed or phil.keyframes:
+                logging.info(
+                    f"{now_str} - Send deadzone: {phil.suppressed} movements held back by the server, {phil.keyframes} keyframes"
+                )
+            if absolute.session is not None:
+                logging.info(
+                    f"{now_str} - Absolute transport: {absolute.recovered} lost samples recovered, {absolute.duplicates} duplicates dropped"
+                )
@@ -0,0 +1,43 @@
+import atexit
+import os
+from time import time
+
+# A mouse that doesn't move anything, it just records where the cursor would
+# have gone. Used with --mouse null for testing and benchmarking without a
+# desktop session, see tools/loopback_harness.py.
+#
+# Set PHILNAV_MOUSE_LOG to a file path to save the moves on exit, one
+# "time x y time_cam" line per move, where time_cam is when the camera
+# captured the frame that caused it.
+
+moves = []  # (time, x, y, time_cam)
+current_x = 0
+current_y = 0
+capture_time = 0.0
+
+
+def getCursorPos():
+    return current_x, current_y
+
+
+def setCursorPos(x, y):
+    global current_x, current_y
+    current_x = x
+    current_y = y
+    moves.append((time(), x, y, capture_time))
+
+
+def set_capture_time(time_cam):
+    # main.py calls this before each setCursorPos()
+    global capture_time
+    capture_time = time_cam
+
+
+def save(path):
+    with open(path, "w") as f:
+        for t, x, y, time_cam in moves:
+            f.write(f"{t:.6f} {x} {y} {time_cam:.6f}\n")
+
+
+if os.environ.get("PHILNAV_MOUSE_LOG"):
+    atexit.register(save, os.environ["PHILNAV_MOUSE_LOG"])
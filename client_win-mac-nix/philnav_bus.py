@@ -0,0 +1,152 @@
+import argparse
+import struct
+from collections import namedtuple
+from multiprocessing import shared_memory
+from time import sleep, time
+
+# Local output bus: the client (with --publish) writes every sample it
+# receives, raw and filtered, into a ring buffer in shared memory. Any number
+# of other programs on this PC (OpenTrack bridges, game plug-ins, loggers) can
+# follow along without touching the network:
+#
+#   from philnav_bus import BusReader
+#   reader = BusReader()
+#   for sample in reader.follow():
+#       print(sample.x_raw, sample.y_raw, sample.x_cursor, sample.y_cursor)
+#
+# Or run this file to print the stream: python3 philnav_bus.py
+#
+# There is one writer and no locks. Each record carries its own sequence
+# number, written last; a reader that sees a different number than expected
+# knows the writer lapped it and skips ahead.
+
+DEFAULT_NAME = "philnav"
+MAGIC = b"PNB1"
+HEADER = struct.Struct("<4sIIIQ")  # magic, version, capacity, record size, seq
+HEADER_SIZE = 64
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 16  # seq is the last header field
+RECORD = struct.Struct("<QddddddddII")
+# seq, time, camera capture time, raw x/y diff (after --rotate), filtered x/y
+# diff (after smoothing), cursor x/y, flags, padding. While the mouse is
+# paused (hotkey), samples keep coming with a filtered diff of 0.
+FLAG_MOVED = 1  # the cursor moved, the filtered diff wasn't in the deadzone
+
+Sample = namedtuple(
+    "Sample",
+    "seq time time_cam x_raw y_raw x_filtered y_filtered x_cursor y_cursor flags",
+)
+
+
+def open_shared_memory(name):
+    # Readers must not delete the writer's shared memory when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except (ImportError, AttributeError):
+            pass
+        return shm
+
+
+class BusWriter:
+    def __init__(self, name=DEFAULT_NAME, capacity=1024):
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * RECORD.size
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:  # left behind by a client that crashed
+            stale = open_shared_memory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buf = self.shm.buf
+        self.seq = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, 1, capacity, RECORD.size, 0)
+
+    def write(self, time_cam, x_raw, y_raw, x_filtered, y_filtered, x_cursor, y_cursor, flags=0):
+        self.seq += 1
+        offset = HEADER_SIZE + (self.seq % self.capacity) * RECORD.size
+        SEQ.pack_into(self.buf, offset, 0)  # being written
+        RECORD.pack_into(
+            self.buf, offset, 0, time(), time_cam, x_raw, y_raw,
+            x_filtered, y_filtered, x_cursor, y_cursor, flags, 0,
+        )
+        SEQ.pack_into(self.buf, offset, self.seq)
+        SEQ.pack_into(self.buf, SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class BusReader:
+    def __init__(self, name=DEFAULT_NAME, from_start=False):
+        self.shm = open_shared_memory(name)
+        self.buf = self.shm.buf
+        magic, _version, self.capacity, record_size, seq = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.close()
+            raise RuntimeError(f"Shared memory {name} isn't a PhilNav bus")
+        # by default, only samples written from now on
+        self.seq = max(0, seq - self.capacity) if from_start else seq
+        self.missed = 0  # samples overwritten before we read them
+
+    @property
+    def latest(self):
+        return SEQ.unpack_from(self.buf, SEQ_OFFSET)[0]
+
+    def read(self):
+        """Returns the samples written since the last call, oldest first"""
+        samples = []
+        head = self.latest
+        if head - self.seq > self.capacity:  # fell behind, skip ahead
+            self.missed += head - self.seq - self.capacity
+            self.seq = head - self.capacity
+        while self.seq < head:
+            want = self.seq + 1
+            offset = HEADER_SIZE + (want % self.capacity) * RECORD.size
+            record = RECORD.unpack_from(self.buf, offset)
+            if record[0] != want or SEQ.unpack_from(self.buf, offset)[0] != want:
+                # overwritten (or being written) while we were reading it
+                self.missed += 1
+            else:
+                samples.append(Sample(*record[:-1]))
+            self.seq = want
+        return samples
+
+    def follow(self, poll=0.002):
+        """Yields samples forever, checking for new ones every poll seconds"""
+        while True:
+            samples = self.read()
+            if not samples:
+                sleep(poll)
+            yield from samples
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--name", type=str, default=DEFAULT_NAME, help=f"shared memory name, same as the client's --publish, default {DEFAULT_NAME}"
+    )
+    args = parser.parse_args()
+
+    reader = BusReader(args.name)
+    print(f"{'seq':>8}, {'x_raw':>8}, {'y_raw':>8}, {'x_filt':>8}, {'y_filt':>8}, {'x_cur':>8}, {'y_cur':>8}, {'moved':>5}")
+    try:
+        for s in reader.follow():
+            print(
+                f"{s.seq:>8}, {s.x_raw:> 8.2f}, {s.y_raw:> 8.2f}, {s.x_filtered:> 8.2f}, {s.y_filtered:> 8.2f}, {s.x_cursor:>8.0f}, {s.y_cursor:>8.0f}, {s.flags & FLAG_MOVED:>5}"
+            )
+    except KeyboardInterrupt:
+        pass
+    reader.close()
@@ -0,0 +1,204 @@
+import argparse
+import itertools
+import math
+from time import perf_counter
+
+import numpy as np  # pip install numpy
+
+# Offline tuner for --smooth, --deadzone and --speed. Record a session with
+#
+#   python3 main.py --record session.pnr
+#
+# (hold still for a while, then move around, point at small things, etc.)
+# and replay it through the same filter as main.py's mouse_move(), for every
+# combination of settings at once:
+#
+#   python3 tune.py session.pnr
+#   python3 tune.py session.pnr --smooth 1 2 3 4 5 --speed 20 25 --profile me.txt
+#   python3 main.py $(cat me.txt)
+#
+# For each combination it reports, in camera pixels (screen pixels divided by
+# the speed, so speeds compare fairly):
+#   jitter:    RMS cursor movement per packet while you're holding still
+#   lag:       how far behind your head the cursor is while moving, in ms
+#   overshoot: how far the cursor keeps going after you stop
+# Lower is better for all three. How fast the cursor moves is up to you, so
+# --smooth and --deadzone are ranked separately for each --speed.
+
+RECORD_MAGIC = b"PNR1"  # same as main.py
+RECORD = np.dtype([("t", "<f8"), ("time_cam", "<f8"), ("x", "<f4"), ("y", "<f4")])
+
+parser = argparse.ArgumentParser()
+parser.add_argument("recording", type=str, help="file saved with main.py --record")
+parser.add_argument(
+    "--smooth", type=int, nargs="+", default=list(range(1, 9)), help="--smooth values to try, default 1-8"
+)
+parser.add_argument(
+    "--deadzone", type=float, nargs="+", default=[round(0.01 * i, 2) for i in range(16)], help="--deadzone values to try, default 0.0-0.15"
+)
+parser.add_argument(
+    "--speed", type=float, nargs="+", default=[25.0], help="--speed values to try, default 25. The y-axis uses speed * 1.25, like main.py. --profile uses the first one"
+)
+parser.add_argument(
+    "--rotate", type=float, default=0, help="same as main.py --rotate, default 0"
+)
+parser.add_argument(
+    "--rest", type=float, default=0.3, help="average movement (camera pixels per packet) below which you count as holding still, default 0.3"
+)
+parser.add_argument(
+    "--window", type=int, default=10, help="packets averaged when deciding moving/still and measuring lag, default 10"
+)
+parser.add_argument(
+    "--lag-weight", type=float, default=0.0008, help="score = jitter + lag * this + overshoot, default 0.0008 (50 ms of lag = 0.04 camera px of jitter, 1 screen px at --speed 25)"
+)
+parser.add_argument(
+    "--top", type=int, default=15, help="show the best N combinations for each speed, default 15"
+)
+parser.add_argument(
+    "--profile", type=str, default=None, help="save the best combination's client arguments to this file"
+)
+args = parser.parse_args()
+
+
+def load(path):
+    with open(path, "rb") as f:
+        if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise SystemExit(f"{path} isn't a PhilNav recording (main.py --record)")
+        data = np.frombuffer(f.read(), dtype=RECORD)
+    # a recording cut off mid-record loses the last partial one
+    return data
+
+
+def moving_average(values, window):
+    # Same as smooth() over a deque(maxlen=window): fewer values at the start
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    n = np.arange(1, len(values) + 1)
+    start = np.maximum(0, n - window)
+    return (sums[n] - sums[start]) / np.minimum(n, window)
+
+
+def lagged(values, window):
+    # values[k] - values[k - window], along the last axis (0 at the start)
+    out = np.zeros_like(values)
+    out[..., window:] = values[..., window:] - values[..., :-window]
+    return out
+
+
+data = load(args.recording)
+if len(data) < 2 * args.window:
+    raise SystemExit("Recording is too short")
+t = data["t"]
+x = data["x"].astype(np.float64)
+y = data["y"].astype(np.float64)
+if args.rotate:
+    rad = math.radians(args.rotate)
+    x, y = x * math.cos(rad) - y * math.sin(rad), x * math.sin(rad) + y * math.cos(rad)
+n = len(x)
+perf_start = perf_counter()
+
+# Holding still or moving? Judged from the raw movements, the same for every
+# combination of settings.
+magnitude = np.hypot(x, y)
+activity = moving_average(magnitude, args.window)
+moving = activity >= args.rest
+resting = ~moving
+# A movement ends where moving turns into resting; the cursor should have
+# settled `window` packets later.
+stops = np.flatnonzero(moving[:-1] & resting[1:]) + 1
+all_starts = np.flatnonzero(moving & ~np.r_[False, moving[:-1]])
+starts = all_starts[np.searchsorted(all_starts, stops, side="right") - 1]
+settled = np.minimum(stops + args.window, n - 1)
+t_lag = np.maximum(lagged(t, args.window), 1e-6)
+
+# The smoothing tier depends only on the raw movement
+mag2 = x**2 + y**2
+tier_long = mag2 < 0.2  # more smoothing
+tier_short = (mag2 >= 0.2) & (mag2 < 0.5)  # less smoothing
+
+deadzones = np.array(args.deadzone)[:, None, None]  # (D, 1, 1)
+speeds = np.array(args.speed)[None, :, None]  # (1, S, 1)
+results = []
+
+for smooth in args.smooth:
+    smooth = max(1, smooth)
+    x_short, y_short = moving_average(x, smooth), moving_average(y, smooth)
+    x_long, y_long = moving_average(x, smooth * 3 + 1), moving_average(y, smooth * 3 + 1)
+    x_smooth = np.where(tier_long, x_long, np.where(tier_short, x_short, x))
+    y_smooth = np.where(tier_long, y_long, np.where(tier_short, y_short, y))
+
+    # Inside the deadzone the cursor doesn't move, for each deadzone (D, 1, N)
+    accel_avg = np.hypot(x_short, y_short)
+    moves = ~((accel_avg > 0) & (accel_avg < deadzones))
+
+    # The cursor is rounded to whole pixels every move: round(cur + d) is
+    # cur + round(d) when cur is whole, so the path is a cumulative sum.
+    x_step = np.round(x_smooth * speeds) * moves  # (D, S, N)
+    y_step = np.round(y_smooth * speeds * 1.25) * moves
+    # Back to camera pixels, so different speeds compare fairly
+    x_step = x_step / speeds
+    y_step = y_step / (speeds * 1.25)
+    x_cursor = np.cumsum(x_step, axis=-1)
+    y_cursor = np.cumsum(y_step, axis=-1)
+    # Where the cursor would be without any filtering
+    x_ideal = np.cumsum(x)  # (N,)
+    y_ideal = np.cumsum(y)
+
+    # jitter: cursor movement while holding still
+    if resting.any():
+        jitter = np.sqrt(np.mean((x_step**2 + y_step**2)[..., resting], axis=-1))
+    else:
+        jitter = np.zeros(x_step.shape[:2])
+
+    # lag: distance behind the unfiltered path, over how fast that's moving
+    x_behind = lagged(x_ideal, args.window) - lagged(x_cursor, args.window)
+    y_behind = lagged(y_ideal, args.window) - lagged(y_cursor, args.window)
+    velocity = np.hypot(lagged(x_ideal, args.window), lagged(y_ideal, args.window)) / t_lag
+    use = moving.copy()
+    use[: args.window] = False
+    if use.any():
+        lag_s = np.hypot(x_behind, y_behind)[..., use] / np.maximum(velocity[use], 1e-6)
+        lag_ms = np.median(lag_s, axis=-1) * 1000
+    else:
+        lag_ms = np.zeros(x_step.shape[:2])
+
+    # overshoot: how far the cursor keeps going, in the direction you were
+    # moving, after you stopped. Measured from where it was at the stop, less
+    # whatever your head still drifted meanwhile.
+    if len(stops):
+        dx = x_ideal[stops] - x_ideal[starts]
+        dy = y_ideal[stops] - y_ideal[starts]
+        length = np.maximum(np.hypot(dx, dy), 1e-6)
+        ux, uy = dx / length, dy / length  # (M,)
+        after = np.minimum(stops[:, None] + np.arange(args.window + 1), n - 1)  # (M, W)
+        cx = x_cursor[..., after] - x_cursor[..., stops, None]
+        cy = y_cursor[..., after] - y_cursor[..., stops, None]
+        ix = x_ideal[after] - x_ideal[stops, None]
+        iy = y_ideal[after] - y_ideal[stops, None]
+        along = (cx - ix) * ux[:, None] + (cy - iy) * uy[:, None]
+        overshoot = np.mean(np.maximum(0.0, along.max(axis=-1)), axis=-1)
+    else:
+        overshoot = np.zeros(x_step.shape[:2])
+
+    for (d, deadzone), (s, speed) in itertools.product(enumerate(args.deadzone), enumerate(args.speed)):
+        score = jitter[d, s] + lag_ms[d, s] * args.lag_weight + overshoot[d, s]
+        results.append((score, smooth, deadzone, speed, jitter[d, s], lag_ms[d, s], overshoot[d, s]))
+
+seconds = perf_counter() - perf_start
+results.sort()
+print(
+    f"{n} packets over {t[-1] - t[0]:.0f}s, {np.count_nonzero(resting) / n:.0%} holding still, {len(stops)} movements. "
+    f"Tried {len(results)} combinations in {seconds:.2f}s."
+)
+for speed in args.speed:
+    print(f"\n--speed {speed:g}")
+    print(f"{'score':>8}, {'smooth':>6}, {'deadzone':>8}, {'jitter px':>9}, {'lag ms':>8}, {'overshoot':>9}")
+    ranked = [r for r in results if r[3] == speed]
+    for score, smooth, deadzone, _speed, jitter, lag, overshoot in ranked[: args.top]:
+        print(f"{score:>8.4f}, {smooth:>6}, {deadzone:>8.2f}, {jitter:>9.4f}, {lag:>8.1f}, {overshoot:>9.3f}")
+
+if args.profile:
+    speed = args.speed[0]
+    _score, smooth, deadzone, *_ = next(r for r in results if r[3] == speed)
+    with open(args.profile, "w") as f:
+        f.write(f"--smooth {smooth} --deadzone {deadzone:g} --x-speed {speed:g} --y-speed {speed * 1.25:g}\n")
+    print(f"\nSaved the best settings for --speed {speed:g} to {args.profile}")
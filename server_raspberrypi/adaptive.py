@@ -0,0 +1,129 @@
+from time import perf_counter
+
+# Picks the highest frame rate that blobby() can keep up with. Watches how long
+# each frame takes to process and how often frames actually arrive, and steps
+# the frame rate (and sensor mode, if needed) down when over budget and back up
+# when there's room. No picamera2 here, so it can be driven by the fake camera
+# or replayed frame timings.
+
+FPS_STEPS = (30.0, 45.0, 60.0, 75.0, 90.0, 100.0, 120.0)
+
+
+def starting_view(sensor_modes, fps):
+    """crop_limits of the sensor mode build_levels() would pick for fps: the
+    part of the sensor the camera sees. None if the modes don't say."""
+    modes = [mode for mode in sensor_modes if mode.get("fps", 0) >= fps]
+    if not modes:  # too fast for this camera, the fastest mode is closest
+        modes = sorted(sensor_modes, key=lambda m: m.get("fps", 0))[-1:]
+    if not modes:
+        return None
+    return max(modes, key=lambda m: m["size"][0] * m["size"][1]).get("crop_limits")
+
+
+def build_levels(sensor_modes, max_fps, fps_steps=FPS_STEPS, view=None):
+    """Returns [(fps, sensor_mode)], slowest first. Each frame rate uses the
+    biggest sensor mode that can do it (binned modes are faster, but see less
+    detail). sensor_mode is one of picam2.sensor_modes, or None to let
+    libcamera choose.
+
+    With view (crop_limits, see starting_view()), only modes that see the
+    same part of the sensor are used. Otherwise a cropped mode would make the
+    mouse faster and move the glare around whenever the level changes."""
+    if view is not None:
+        sensor_modes = [mode for mode in sensor_modes if mode.get("crop_limits") == view]
+    levels = []
+    for fps in fps_steps:
+        if fps > max_fps:
+            continue
+        modes = [mode for mode in sensor_modes if mode.get("fps", 0) >= fps]
+        if sensor_modes and not modes:
+            continue  # too fast for this camera
+        mode = max(modes, key=lambda m: m["size"][0] * m["size"][1]) if modes else None
+        levels.append((fps, mode))
+    return levels
+
+
+class FrameRateController:
+    def __init__(self, levels, fps, budget=0.7, margin=0.75, window=0.5, hold=3.0, clock=perf_counter):
+        self.levels = levels
+        self.budget = budget  # fraction of the frame interval blobby() may use
+        self.margin = margin  # only speed up if we'd still be under budget * margin
+        self.window = window  # seconds of frames to average before deciding
+        self.hold = hold  # seconds to wait after a change before speeding up
+        self.clock = clock
+        self.level = self.nearest(fps)
+        self.changed_at = clock()
+        self.settling = False
+        self._reset_window()
+        self.changes = 0
+
+    def _reset_window(self):
+        self.window_started = self.clock()
+        self.frames = 0
+        self.sum_ms = 0.0
+        self.sum_interval_ms = 0.0
+
+    def nearest(self, fps):
+        # index of the fastest level not above fps
+        below = [i for i, (level_fps, _mode) in enumerate(self.levels) if level_fps <= fps]
+        return below[-1] if below else 0
+
+    @property
+    def fps(self):
+        return self.levels[self.level][0]
+
+    @property
+    def sensor_mode(self):
+        return self.levels[self.level][1]
+
+    def jump_to(self, fps):
+        # eg. when the frame rate is set by hand with control.py
+        self.level = self.nearest(fps)
+        self.changed_at = self.clock()
+        self.settling = True
+        self._reset_window()
+
+    def resume(self):
+        # after the camera was stopped, eg. no heartbeat: start a fresh window
+        # and skip it, the camera is still starting up
+        self.settling = True
+        self._reset_window()
+
+    def observe(self, ms_frame, ms_interval):
+        """Call once per frame with the processing time and the time since the
+        previous frame. Returns the new level's (fps, sensor_mode) when it
+        should change, otherwise None."""
+        self.frames += 1
+        self.sum_ms += ms_frame
+        self.sum_interval_ms += ms_interval
+        now = self.clock()
+        if now - self.window_started < self.window:
+            return None
+
+        ms_avg = self.sum_ms / self.frames
+        interval_avg = self.sum_interval_ms / self.frames
+        self._reset_window()
+        if self.settling:
+            # the first window after a change includes the switch itself
+            self.settling = False
+            return None
+        ms_budget = 1000 / self.fps * self.budget
+
+        # Over budget, or frames are arriving late (backing up): slow down
+        overloaded = ms_avg > ms_budget or interval_avg > 1000 / self.fps * 1.25
+        if overloaded and self.level > 0:
+            self.level -= 1
+        elif (
+            not overloaded
+            and self.level < len(self.levels) - 1
+            and now - self.changed_at > self.hold
+            and ms_avg < 1000 / self.levels[self.level + 1][0] * self.budget * self.margin
+        ):
+            self.level += 1
+        else:
+            return None
+
+        self.changed_at = now
+        self.settling = True
+        self.changes += 1
+        return self.levels[self.level]
@@ -0,0 +1,65 @@
+import cv2  # OpenCV, for thresholding and blob detection
+import numpy as np  # for preallocated buffers
+
+
+# Finding the IR sticker again after it's been lost (you turned away, or
+# PhilNav was paused) means searching the whole frame, which gets expensive at
+# higher resolutions. Instead, look for bright spots in a small copy of the
+# frame, then run blob detection at full resolution only around them.
+#
+# The small copy takes every 4th pixel of every 4th row. Averaging (resize
+# with INTER_AREA, or pyrDown) reads the whole frame, which costs more than
+# blob detection itself. A sticker at least 4 pixels wide (--blob-size 15 is
+# about 4.4) always has a sample on it, at full brightness.
+class CoarseSearch:
+    def __init__(self, threshold=200, scale=4, radius=24, candidates=3):
+        self.threshold = threshold  # same as --blob-min-threshold
+        self.scale = scale  # downsampling factor
+        self.radius = radius  # full resolution pixels searched around a candidate
+        self.candidates = candidates  # at most this many bright spots are refined
+        self.shape = None
+        self.small = None
+        self.small_mask = None
+
+    def _allocate(self, shape):
+        self.shape = shape
+        h, w = shape[:2]
+        h_small, w_small = -(-h // self.scale), -(-w // self.scale)  # round up
+        self.small = np.zeros((h_small, w_small), np.uint8)
+        self.small_mask = np.zeros((h_small, w_small), np.uint8)
+
+    def find_candidates(self, frame):
+        """Bright spots as full resolution (x, y), brightest area first"""
+        if self.shape != frame.shape:
+            self._allocate(frame.shape)
+        # The IR image is grey, so one channel (green) will do
+        if frame.ndim == 3:
+            np.copyto(self.small, frame[:: self.scale, :: self.scale, 1])
+        else:
+            np.copyto(self.small, frame[:: self.scale, :: self.scale])
+        # Nothing bright at all, the usual case while the sticker is lost
+        _min, max_val, _min_loc, _max_loc = cv2.minMaxLoc(self.small)
+        if max_val < self.threshold:
+            return []
+        cv2.threshold(self.small, self.threshold - 1, 255, cv2.THRESH_BINARY, dst=self.small_mask)
+        count, _labels, stats, centroids = cv2.connectedComponentsWithStats(self.small_mask)
+        # label 0 is the background
+        found = sorted(range(1, count), key=lambda i: stats[i, cv2.CC_STAT_AREA], reverse=True)
+        return [
+            (centroids[i][0] * self.scale, centroids[i][1] * self.scale)
+            for i in found[: self.candidates]
+        ]
+
+    def detect(self, frame, detector):
+        """Same as detector.detect(frame), but only near the bright spots"""
+        h, w = frame.shape[:2]
+        keypoints = []
+        for x, y in self.find_candidates(frame):
+            x0 = max(0, int(x) - self.radius)
+            y0 = max(0, int(y) - self.radius)
+            x1 = min(w, int(x) + self.radius)
+            y1 = min(h, int(y) + self.radius)
+            for kp in detector.detect(frame[y0:y1, x0:x1]):
+                kp_x, kp_y = kp.pt
+                keypoints.append(cv2.KeyPoint(kp_x + x0, kp_y + y0, kp.size))
+        return keypoints
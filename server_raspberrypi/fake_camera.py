@@ -0,0 +1,139 @@
+from threading import Thread
+from time import time, sleep
+import cv2  # OpenCV, for drawing the synthetic IR sticker
+import numpy as np
+
+# Stand-ins for picamera2/libcamera, so the server can run on any Linux PC
+# (eg. in CI) with --fake-camera. Frames show a single white dot moving along
+# a known path, trajectory(), so whatever comes out the other end can be
+# compared against the ground truth.
+
+MARGIN = 40  # keep the dot this far from the edges
+
+
+def triangle(u, length):
+    # 0 -> length -> 0 -> ... as u increases
+    u = u % (2 * length)
+    return u if u < length else 2 * length - u
+
+
+def trajectory(t, width, height, speed):
+    """Ground truth position of the dot at time t (seconds since the epoch).
+    Sweeps back and forth at speed px/s in x, and half that in y."""
+    x = MARGIN + triangle(t * speed, width - 2 * MARGIN)
+    y = MARGIN + triangle(t * speed / 2, height - 2 * MARGIN)
+    return x, y
+
+
+class Preview:
+    QT = "QT"
+    NULL = "NULL"
+
+
+class Transform:
+    def __init__(self, hflip=0, vflip=0):
+        self.hflip = hflip
+        self.vflip = vflip
+
+
+class FakeRequest:
+    def __init__(self, array, captured_at, load_ms=0.0):
+        self.array = array
+        self.captured_at = captured_at
+        self.load_ms = load_ms
+
+
+class MappedArray:
+    def __init__(self, request, stream):
+        self.request = request
+        self.array = request.array
+
+    def __enter__(self):
+        # Simulated processing cost, so blobby() measures a slower Pi
+        if self.request.load_ms > 0:
+            sleep(self.request.load_ms / 1000)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Picamera2:
+    # Dot speed in px/s, set from the command line with --fake-camera-speed
+    speed = 90.0
+    # Extra ms spent on each frame, --fake-camera-load
+    load_ms = 0.0
+    # Same as the Camera Module 3, where the fastest mode is cropped
+    sensor_modes = [
+        {"size": (1536, 864), "fps": 120.13, "bit_depth": 10, "crop_limits": (768, 432, 3072, 1728)},
+        {"size": (2304, 1296), "fps": 56.03, "bit_depth": 10, "crop_limits": (0, 0, 4608, 2592)},
+        {"size": (4608, 2592), "fps": 14.35, "bit_depth": 10, "crop_limits": (0, 0, 4608, 2592)},
+    ]
+
+    def __init__(self):
+        self.started = False
+        self.pre_callback = None
+        self.size = (320, 240)
+        self.fps = 75.0
+        self.max_fps = 120.13
+        self.frames = 0
+        self._thread = None
+
+    def create_preview_configuration(self, main=None, transform=None, sensor=None):
+        return {"main": main or {}, "transform": transform, "sensor": sensor or {}}
+
+    def configure(self, config):
+        self.size = tuple(config["main"].get("size", self.size))
+        output_size = config["sensor"].get("output_size")
+        modes = [m for m in self.sensor_modes if m["size"] == output_size]
+        self.max_fps = modes[0]["fps"] if modes else self.sensor_modes[0]["fps"]
+        self.fps = min(self.fps, self.max_fps)
+
+    def set_controls(self, controls):
+        self.fps = min(float(controls.get("FrameRate", self.fps)), self.max_fps)
+
+    def start_preview(self, preview=None):
+        pass
+
+    def stop_preview(self):
+        pass
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.started = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        width, height = self.size
+        # XBGR8888, like the real preview configuration
+        frame = np.zeros((height, width, 4), np.uint8)
+        next_at = time()
+        while self.started:
+            # Like a real camera: if the callback is too slow, frames back up
+            # and the frame rate drops.
+            delay = next_at - time()
+            if delay > 0:
+                sleep(delay)
+            next_at = max(next_at + 1 / self.fps, time() - 1 / self.fps)
+
+            captured_at = time()
+            x, y = trajectory(captured_at, width, height, self.speed)
+            frame[:] = 0
+            # subpixel position, 4 fractional bits
+            cv2.circle(
+                frame, (int(x * 16), int(y * 16)), 6 * 16, (255, 255, 255, 255), -1, cv2.LINE_AA, 4
+            )
+            self.frames += 1
+            if self.pre_callback is not None:
+                self.pre_callback(FakeRequest(frame, captured_at, self.load_ms))
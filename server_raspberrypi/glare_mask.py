@@ -0,0 +1,129 @@
+import cv2  # OpenCV, for thresholding and masking
+import numpy as np  # for preallocated buffers
+
+
+# Learns where the static bright spots are (windows, monitor bezels, IR LED
+# reflections) so they can be blacked out before blob detection. A pixel that
+# is bright in nearly every frame is glare; the IR sticker moves around with
+# your head, so it doesn't stay bright in the same place.
+#
+# All buffers are allocated once, on the first frame, and reused. Applying the
+# mask is a single cv2.bitwise_and per frame.
+#
+# Run this file to check the masking: python3 glare_mask.py
+class GlareMask:
+    def __init__(self, threshold=200, warmup=75, rate=0.002, every=15, ratio=0.95, margin=20):
+        self.threshold = threshold  # same as --blob-min-threshold
+        self.warmup = warmup  # frames to learn from before masking anything
+        self.rate = rate  # how fast the model forgets after warm-up
+        self.every = every  # after warm-up, only update every N frames
+        self.ratio = ratio  # bright this often = glare
+        self.margin = margin  # never learn pixels this close to the marker
+        self.frames = 0
+        self.shape = None
+        self.gray = None
+        self.bright = None
+        self.avg = None
+        self.glare = None
+        self.mask = None
+        self.mask_frame = None  # mask with the frame's channels, for apply()
+        self.kernel = np.ones((5, 5), np.uint8)
+
+    def _allocate(self, shape):
+        self.shape = shape
+        h, w = shape[:2]
+        self.gray = np.zeros((h, w), np.uint8)
+        self.bright = np.zeros((h, w), np.float32)
+        self.avg = np.zeros((h, w), np.float32)
+        self.glare = np.zeros((h, w), np.uint8)
+        self.mask = np.full((h, w), 255, np.uint8)  # 255 = keep, 0 = glare
+        self.mask_frame = np.full(shape, 255, np.uint8)
+
+    def reset(self):
+        # the view changed (eg. another sensor mode), learn it again
+        self.shape = None
+
+    @property
+    def ready(self):
+        return self.frames >= self.warmup
+
+    @property
+    def coverage(self):
+        # fraction of the frame that is masked out, for verbose logging
+        if self.mask is None:
+            return 0.0
+        return 1.0 - cv2.countNonZero(self.mask) / self.mask.size
+
+    def update(self, frame, marker=None):
+        if self.shape != frame.shape:
+            self._allocate(frame.shape)
+            self.frames = 0
+        self.frames += 1
+        if self.frames > self.warmup and self.frames % self.every != 0:
+            return
+
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        else:
+            self.gray[:] = frame
+        cv2.threshold(self.gray, self.threshold, 1.0, cv2.THRESH_BINARY, dst=self.gray)
+        self.bright[:] = self.gray
+
+        # The sticker is allowed to sit still (eg. while reading), so after
+        # warm-up the area around it is never learned as glare.
+        if marker is not None and self.frames > self.warmup:
+            x, y = int(marker[0]), int(marker[1])
+            self.bright[
+                max(0, y - self.margin) : y + self.margin,
+                max(0, x - self.margin) : x + self.margin,
+            ] = self.avg[
+                max(0, y - self.margin) : y + self.margin,
+                max(0, x - self.margin) : x + self.margin,
+            ]
+
+        if self.frames <= self.warmup:
+            # running mean over the warm-up frames
+            cv2.accumulateWeighted(self.bright, self.avg, 1.0 / self.frames)
+        else:
+            cv2.accumulateWeighted(self.bright, self.avg, self.rate)
+
+        if self.frames >= self.warmup:
+            cv2.threshold(self.avg, self.ratio, 255, cv2.THRESH_BINARY, dst=self.bright)
+            self.glare[:] = self.bright
+            # grow the glare a little, its edges flicker around the threshold
+            cv2.dilate(self.glare, self.kernel, dst=self.glare)
+            cv2.bitwise_not(self.glare, dst=self.mask)
+            if self.mask_frame.ndim == 3:
+                self.mask_frame[:] = self.mask[:, :, None]
+            else:
+                self.mask_frame[:] = self.mask
+
+    def apply(self, frame):
+        # in-place, so detector.detect() sees black wherever there is glare
+        if not self.ready or self.shape != frame.shape:
+            return
+        # Not bitwise_and(frame, frame, mask=...): that leaves dst alone where
+        # the mask is 0, and dst is the frame, so the glare would stay.
+        cv2.bitwise_and(frame, self.mask_frame, dst=frame)
+
+
+if __name__ == "__main__":
+    # A static bright block is learned as glare and blacked out, a moving
+    # sticker isn't.
+    for channels in (None, 3, 4):
+        shape = (240, 320) if channels is None else (240, 320, channels)
+        glare = GlareMask(warmup=10)
+        for i in range(glare.warmup):
+            frame = np.zeros(shape, np.uint8)
+            frame[100:110, 200:210] = 255  # glare
+            x = 20 + i * 10
+            frame[50:55, x : x + 5] = 255  # sticker
+            glare.update(frame, (x + 2, 52))
+        frame = np.zeros(shape, np.uint8)
+        frame[100:110, 200:210] = 255
+        frame[50:55, 150:155] = 255
+        glare.apply(frame)
+        assert glare.ready and glare.coverage > 0
+        assert frame[100:110, 200:210].max() == 0, "glare not masked"
+        assert frame[50:55, 150:155].min() == 255, "sticker masked"
+        print(f"{shape}: ok, {glare.coverage:.2%} masked")
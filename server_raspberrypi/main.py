@@ -1,14 +1,16 @@
+import startup  # first, so that everything after it is timed
 import argparse
 import logging
 from time import time, ctime, perf_counter, sleep
 from dataclasses import dataclass
-from threading import Thread
+from threading import Thread, Event
 import socket  # udp networking
 import struct  # binary packing
-from picamera2 import Picamera2, Preview, MappedArray  # Raspberry Pi camera
-from libcamera import Transform  # taking selfies, so used to mirror image
-import cv2  # OpenCV, for blob detection
-from scale_contour import scale_contour
+import json  # runtime control commands
+import random
+import errno
+import math
+from collections import deque  # recent samples for --transport absolute
 
 
 @dataclass
@@ -79,6 +81,125 @@ parser.add_argument(
     action="store_true",
     help="Tracks the outer perimeter of your reflective sticker. Eg. a pacman shape is tracked as a full circle. This can provide better tracking if your sticker is dull or off-center.",
 )
+parser.add_argument(
+    "--glare-mask",
+    action="store_true",
+    help="Learn the static bright spots in view (windows, monitor bezels, IR LED reflections) while starting up and black them out before blob detection. Keep your sticker out of view, or moving, while it warms up.",
+)
+parser.add_argument(
+    "--glare-warmup",
+    type=int,
+    default=75,
+    help="number of frames used to learn the glare mask at startup, default 75 (one second)",
+)
+parser.add_argument(
+    "--warmup",
+    type=float,
+    default=1.0,
+    help="wait at most N seconds for the camera's exposure to settle before sending mouse movements, default 1.0",
+)
+parser.add_argument(
+    "--coarse-search",
+    action="store_true",
+    help="When the sticker is lost, look for it in a 4x smaller copy of the frame first, then only detect around the bright spots. Faster at higher resolutions, see tools/bench_reacquire.py.",
+)
+parser.add_argument(
+    "--motion-gate",
+    action="store_true",
+    help="Skip blob detection when the frame hasn't changed since the last detection (you're holding still), to save CPU.",
+)
+parser.add_argument(
+    "--motion-gate-noise",
+    type=int,
+    default=10,
+    help="with --motion-gate, brightness change that counts as motion, default 10",
+)
+parser.add_argument(
+    "--motion-gate-max-skip",
+    type=int,
+    default=30,
+    help="with --motion-gate, always detect at least every N frames, default 30",
+)
+parser.add_argument(
+    "--realtime",
+    action="store_true",
+    help="Run frame processing with real-time priority (SCHED_FIFO), lock memory and only collect garbage when idle, to avoid stutter when the Pi is busy. Needs root; falls back to what's permitted.",
+)
+parser.add_argument(
+    "--realtime-cpus",
+    type=str,
+    default="",
+    help="with --realtime, pin frame processing to these CPU cores, eg. 3 or 2,3. Default any",
+)
+parser.add_argument(
+    "--realtime-priority",
+    type=int,
+    default=10,
+    help="with --realtime, SCHED_FIFO priority 1-99, default 10",
+)
+parser.add_argument(
+    "--fake-camera",
+    action="store_true",
+    help="Use a synthetic camera showing a moving dot instead of the Raspberry Pi camera. For testing and benchmarking on any PC, see tools/loopback_harness.py.",
+)
+parser.add_argument(
+    "--fake-camera-speed",
+    type=float,
+    default=90.0,
+    help="speed of the fake camera's dot in pixels per second, default 90",
+)
+parser.add_argument(
+    "--fake-camera-load",
+    type=float,
+    default=0.0,
+    help="extra ms of processing per fake camera frame, to simulate a slower Pi, default 0",
+)
+parser.add_argument(
+    "--adaptive",
+    action="store_true",
+    help="Adjust the frame rate (and sensor mode) while running, to the highest --fps that processing keeps up with. Starts at --fps, and only uses sensor modes that see the same area as the one --fps starts in.",
+)
+parser.add_argument(
+    "--adaptive-any-view",
+    action="store_true",
+    help="with --adaptive, also use sensor modes that see a different (cropped) area. Faster, but the mouse speed changes with the mode.",
+)
+parser.add_argument(
+    "--adaptive-budget",
+    type=float,
+    default=0.7,
+    help="with --adaptive, fraction of each frame's time that processing may use, default 0.7",
+)
+parser.add_argument(
+    "--adaptive-max-fps",
+    type=float,
+    default=120.0,
+    help="with --adaptive, never go above this frame rate, default 120",
+)
+parser.add_argument(
+    "--transport",
+    choices=["delta", "absolute"],
+    default="delta",
+    help="delta: send each frame's movement (OpenTrack's protocol), default. absolute: send the position with a sequence number and recent history, so movements in lost packets aren't lost (Wi-Fi). Needs an up-to-date client.",
+)
+parser.add_argument(
+    "--history",
+    type=int,
+    default=4,
+    help="with --transport absolute, number of recent samples in each packet, default 4",
+)
+parser.add_argument(
+    "--send-deadzone",
+    type=float,
+    default=0.0,
+    help="Hold back movements until they add up to at least N camera pixels, instead of sending every tiny wiggle. Cuts network traffic and client CPU while you hold still. Try 0.1, default 0 (off)",
+)
+parser.add_argument(
+    "--keyframe",
+    type=float,
+    default=1.0,
+    help="with --send-deadzone, send at least one packet every N seconds, default 1.0",
+)
 parser.add_argument(
     "--timeout",
     type=int,
@@ -110,42 +231,164 @@ hflip_num = 1
 if args.no_hflip:
     hflip_num = 0
 
+startup.mark("parse args")
+
+
+# Importing OpenCV and picamera2 each take a while on a Raspberry Pi. Load
+# OpenCV in the background while the camera is being set up.
+def cv2_preload():
+    import cv2  # noqa: F401
+
+
+cv2_thread = Thread(target=cv2_preload, daemon=True)
+cv2_thread.start()
+
+if args.fake_camera:
+    from fake_camera import Picamera2, Preview, MappedArray, Transform
+
+    Picamera2.speed = args.fake_camera_speed
+    Picamera2.load_ms = args.fake_camera_load
+else:
+    from picamera2 import Picamera2, Preview, MappedArray  # Raspberry Pi camera
+    from libcamera import Transform  # taking selfies, so used to mirror image
+
+startup.mark("import picamera2")
 
 picam2 = Picamera2()
-# The camera can be "configured" and "controlled" with different settings in each.
-config_main = {"size": (args.width, args.height)}
-# Not entirely sure how configurations work, preview/main etc.
-config = picam2.create_preview_configuration(
-    main=config_main, transform=Transform(hflip=hflip_num)
-)
-picam2.configure(config)
 
-controls = {
-    "AnalogueGain": args.gain,
-    "Brightness": args.brightness,
-    "Contrast": args.contrast,
-    "ExposureValue": args.exposure,
-    "Saturation": args.saturation,
-    "FrameRate": args.fps,
-}
-picam2.set_controls(controls)
+
+# Set by --adaptive, None lets libcamera choose
+sensor_mode = None
+
+
+def camera_configure():
+    # The camera can be "configured" and "controlled" with different settings in each.
+    config_main = {"size": (args.width, args.height)}
+    config_sensor = {}
+    if sensor_mode is not None:
+        config_sensor["sensor"] = {
+            "output_size": sensor_mode["size"],
+            "bit_depth": sensor_mode["bit_depth"],
+        }
+    # Not entirely sure how configurations work, preview/main etc.
+    config = picam2.create_preview_configuration(
+        main=config_main, transform=Transform(hflip=hflip_num), **config_sensor
+    )
+    picam2.configure(config)
+
+
+def camera_reconfigure():
+    # Reconfigure in place, much faster than restarting PhilNav. Can't be
+    # called from blobby(), stopping the camera waits for it to return.
+    started = picam2.started
+    if started:
+        picam2.stop()
+    # The view may have changed: forget where the sticker and the glare were,
+    # and don't count the gap as a late frame
+    phil.x, phil.y = 0.0, 0.0
+    phil.resumed = True
+    glare_mask = glare
+    if glare_mask is not None:
+        glare_mask.reset()
+    try:
+        camera_configure()
+        picam2.set_controls(camera_controls())
+    finally:
+        # even if the new settings were refused, don't leave it stopped
+        if started:
+            picam2.start()
+
+
+def camera_controls():
+    return {
+        "AnalogueGain": args.gain,
+        "Brightness": args.brightness,
+        "Contrast": args.contrast,
+        "ExposureValue": args.exposure,
+        "Saturation": args.saturation,
+        "FrameRate": args.fps,
+    }
+
+
+camera_configure()
+picam2.set_controls(camera_controls())
+startup.mark("camera configure")
+
+import cv2  # OpenCV, for blob detection (usually already loaded by cv2_thread)
+from scale_contour import scale_contour
+from glare_mask import GlareMask
+from adaptive import FrameRateController, build_levels, starting_view
+from coarse_search import CoarseSearch
+from motion_gate import MotionGate
+from realtime import Deadlines, gc_idle, gc_steady, gc_tick, lock_memory, parse_cpus, realtime_thread
+
+startup.mark("import cv2")
 
 
 # OpenCV blob detection config
-params = cv2.SimpleBlobDetector_Params()
-params.filterByArea = True
-params.minArea = args.blob_size
-params.filterByColor = True
-params.blobColor = args.blob_color
-params.minThreshold = args.blob_min_threshold
-params.maxThreshold = 255
-params.thresholdStep = 50
-params.minRepeatability = 2
-params.minDistBetweenBlobs = 100
-params.filterByCircularity = False
-params.filterByConvexity = False
-params.filterByInertia = False
-detector = cv2.SimpleBlobDetector_create(params)
+def detector_create():
+    params = cv2.SimpleBlobDetector_Params()
+    params.filterByArea = True
+    params.minArea = args.blob_size
+    params.filterByColor = True
+    params.blobColor = args.blob_color
+    params.minThreshold = args.blob_min_threshold
+    params.maxThreshold = 255
+    params.thresholdStep = 50
+    params.minRepeatability = 2
+    params.minDistBetweenBlobs = 100
+    params.filterByCircularity = False
+    params.filterByConvexity = False
+    params.filterByInertia = False
+    return cv2.SimpleBlobDetector_create(params)
+
+
+detector = detector_create()
+startup.mark("detector")
+
+coarse = None
+if args.coarse_search:
+    coarse = CoarseSearch(threshold=args.blob_min_threshold)
+
+gate = None
+if args.motion_gate:
+    gate = MotionGate(noise=args.motion_gate_noise, max_skip=args.motion_gate_max_skip)
+
+adaptive = None
+if args.adaptive:
+    adaptive = FrameRateController(
+        build_levels(
+            picam2.sensor_modes,
+            args.adaptive_max_fps,
+            view=None if args.adaptive_any_view else starting_view(picam2.sensor_modes, args.fps),
+        ),
+        args.fps,
+        budget=args.adaptive_budget,
+    )
+    args.fps = adaptive.fps
+    sensor_mode = adaptive.sensor_mode
+    camera_configure()
+    picam2.set_controls(camera_controls())
+    startup.mark("adaptive")
+
+
+def adaptive_apply(fps, mode):
+    global sensor_mode
+    args.fps = fps
+    if mode is not None and mode != sensor_mode:
+        sensor_mode = mode
+        camera_reconfigure()
+    else:
+        picam2.set_controls({"FrameRate": fps})
+    logging.info(
+        f"{ctime()} - Adaptive: {fps:.0f} fps"
+        + (f", sensor mode {mode['size'][0]}x{mode['size'][1]}" if mode else "")
+    )
+    phil.adapting = False
+
+glare = None
+if args.glare_mask:
+    glare = GlareMask(threshold=args.blob_min_threshold, warmup=args.glare_warmup)
 
 
 def philnav_start():
@@ -157,13 +400,24 @@ def philnav_start():
         picam2.start_preview(Preview.NULL)
 
     # Not sure if we need both start_preview and start.
+    camera_ready.clear()
+    phil.warmup_stable = 0
+    phil.resumed = True
+    if adaptive is not None:
+        adaptive.resume()
     picam2.start()
-    sleep(1)  # let camera warm up
+    # Wait for the camera to warm up: blobby() sets camera_ready once the
+    # frame brightness stops changing, usually well before --warmup.
+    if not camera_ready.wait(timeout=args.warmup):
+        logging.info(f"{ctime()} - Camera still settling after {args.warmup}s")
+        camera_ready.set()
 
-    # show intro again
-    print(text.intro)
-    if args.preview:
-        print(text.preview)
+    if not phil.ready_notified:
+        phil.ready_notified = True
+        startup.mark("camera ready")
+        startup.notify("READY=1")
+        logging.info(f"{ctime()} - Startup: {startup.summary()}")
+    print(f"{ctime()} - SERVER: PhilNav is running\n")
 
 
 def philnav_stop():  # cleanup
@@ -173,34 +427,240 @@ def philnav_stop():  # cleanup
     picam2.stop()
 
 
+# Set when the camera's exposure has settled, mouse movements are only sent
+# after that. Cleared every time the camera is started.
+camera_ready = Event()
+
+
+def camera_warmup(frame):
+    # Auto-exposure takes a few frames to settle. Wait until the average
+    # brightness is stable for a few frames in a row.
+    mean = cv2.mean(frame)[0]
+    if abs(mean - phil.warmup_mean) < 1.0:
+        phil.warmup_stable += 1
+    else:
+        phil.warmup_stable = 0
+    phil.warmup_mean = mean
+    if phil.warmup_stable >= 3:
+        camera_ready.set()
+
+
+# Loss-tolerant transport (--transport absolute). Each datagram has the sum of
+# all movements so far with a sequence number, plus the previous few samples,
+# newest first:
+#   magic, session, seq, count, keyframe, movements held back so far
+#   (--send-deadzone), camera capture time, OpenCV processing time
+#   count * (x, y)
+# The client rebuilds exact movements across lost datagrams and drops
+# duplicates. Keep in sync with client_win-mac-nix/main.py.
+ABSOLUTE_MAGIC = b"PNA2"
+ABSOLUTE_HEADER = struct.Struct("<4sIIBBIdd")
+ABSOLUTE_SAMPLE = struct.Struct("<dd")
+
+
+@dataclass
+class absolute:
+    session = random.getrandbits(32)  # tells the client we restarted
+    seq = 0
+    x = 0.0
+    y = 0.0
+    history = deque([], max(1, min(args.history, 255)))
+
+
+def absolute_pack(x_diff, y_diff, ms_time_spent, keyframe=False):
+    # Only accepted movements are summed, so a "jump" never reaches the cursor
+    absolute.seq += 1
+    absolute.x += x_diff
+    absolute.y += y_diff
+    absolute.history.appendleft(ABSOLUTE_SAMPLE.pack(absolute.x, absolute.y))
+    header = ABSOLUTE_HEADER.pack(
+        ABSOLUTE_MAGIC,
+        absolute.session,
+        absolute.seq,
+        len(absolute.history),
+        1 if keyframe else 0,
+        phil.suppressed % 2**32,  # a total, so lost datagrams don't lose any
+        phil.frame_started_at,
+        ms_time_spent,
+    )
+    return header + b"".join(absolute.history)
+
+
 # Set up UDP socket to receiving computer
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # datagrams over UDP
 sock_addr = (args.ip, args.port)
 
 # initialize networking
 # Read heartbeat datagrams over UDP
-sock_heartbeat = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# With systemd socket activation (see philnav.socket), systemd has already
+# bound the heartbeat port for us.
+sock_heartbeat = startup.listen_socket()
+socket_activated = sock_heartbeat is not None
+if not socket_activated:
+    sock_heartbeat = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock_heartbeat.bind(("0.0.0.0", args.port + 1))  # Register our socket
 # Without a timeout, this script will "hang" if nothing is received
 sock_heartbeat.settimeout(60 * 10)
-sock_heartbeat.bind(("0.0.0.0", args.port + 1))  # Register our socket
 # https://pymotw.com/2/socket/multicast.html
 if args.ip.startswith("224"):  # join multicast group
     group = socket.inet_aton(args.ip)
     mreq = struct.pack("4sL", group, socket.INADDR_ANY)
-    sock_heartbeat.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    try:
+        sock_heartbeat.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    except OSError as err:
+        # systemd keeps its socket open across restarts, and the membership
+        # with it, so a restarted server has already joined
+        if not (socket_activated and err.errno == errno.EADDRINUSE):
+            raise
+
+
+# Runtime control channel, shares the heartbeat port (port+1). A heartbeat is
+# 48 bytes of 6 doubles; a UTF-8 JSON object (starting with "{") is a command, eg.
+#   {"cmd": "status"}
+#   {"cmd": "set", "gain": 3.0, "blob_min_threshold": 180, "contours": true}
+# and the server replies to the sender with JSON. Use
+# client_win-mac-nix/control.py to drive it.
+CONTROL_CAMERA = ("gain", "brightness", "contrast", "exposure", "saturation", "fps")
+CONTROL_DETECTOR = ("blob_size", "blob_color", "blob_min_threshold")
+CONTROL_RESOLUTION = ("width", "height")
+CONTROL_MODES = ("contours", "glare_mask", "coarse_search", "motion_gate", "verbose")
+CONTROL_ALL = CONTROL_CAMERA + CONTROL_DETECTOR + CONTROL_RESOLUTION + CONTROL_MODES
+
+
+def control_status():
+    uptime = time() - phil.started_at
+    return {
+        "settings": {key: getattr(args, key) for key in CONTROL_ALL},
+        "stats": {
+            "camera_started": picam2.started,
+            "uptime": uptime,
+            "frame_num": phil.frame_num,
+            "fps_measured": phil.frame_num / uptime if uptime > 0 else 0.0,
+            "cv_ms": phil.frame_ms,
+            "adaptive_fps": adaptive.fps if adaptive is not None else None,
+            "frames_skipped": gate.skipped if gate is not None else None,
+            "movements_suppressed": phil.suppressed,
+            "keyframes": phil.keyframes,
+            "frames_over_budget": deadlines.missed if deadlines is not None else None,
+            "frames_late": late_frames.missed if deadlines is not None else None,
+            "x": phil.x,
+            "y": phil.y,
+            "glare_coverage": glare.coverage if glare is not None else None,
+            "startup_ms": startup.as_dict(),
+        },
+    }
+
+
+def control_set(settings):
+    global detector, glare, coarse, gate
+    unknown = [key for key in settings if key not in CONTROL_ALL]
+    if unknown:
+        raise ValueError(f"unknown setting: {', '.join(unknown)}")
+    # Check everything before changing anything, so a bad value doesn't leave
+    # the other settings half applied
+    parsed = {}
+    for key, value in settings.items():
+        # coerce to the same type as the command line argument
+        if isinstance(getattr(args, key), bool) and isinstance(value, str):
+            value = value.lower() in ("1", "true", "yes", "on")
+        parsed[key] = type(getattr(args, key))(value)
+    if "fps" in parsed and parsed["fps"] < 1:
+        raise ValueError("fps must be at least 1")
+    for key in CONTROL_RESOLUTION + ("blob_size",):
+        if key in parsed and parsed[key] <= 0:
+            raise ValueError(f"{key} must be positive")
+    for key in ("blob_color", "blob_min_threshold"):
+        if key in parsed and not 0 <= parsed[key] <= 255:
+            raise ValueError(f"{key} must be 0-255")
+    previous = {key: getattr(args, key) for key in parsed}
+    for key, value in parsed.items():
+        setattr(args, key, value)
+
+    resolution = any(key in settings for key in CONTROL_RESOLUTION)
+    try:
+        if resolution:
+            camera_reconfigure()
+        elif any(key in settings for key in CONTROL_CAMERA):
+            picam2.set_controls(camera_controls())
+    except Exception:
+        # The camera refused: put the previous settings back, on it too
+        for key, value in previous.items():
+            setattr(args, key, value)
+        try:
+            if resolution:
+                camera_reconfigure()
+            else:
+                picam2.set_controls(camera_controls())
+        except Exception as err:
+            logging.warning(f"{ctime()} - Couldn't restore camera settings: {err}")
+        raise
+    if "fps" in settings and adaptive is not None:
+        adaptive.jump_to(args.fps)
+
+    if any(key in settings for key in CONTROL_DETECTOR):
+        detector = detector_create()
+
+    if args.glare_mask and glare is None:
+        glare = GlareMask(threshold=args.blob_min_threshold, warmup=args.glare_warmup)
+    elif not args.glare_mask:
+        glare = None
+    if glare is not None:
+        glare.threshold = args.blob_min_threshold
+    if args.coarse_search and coarse is None:
+        coarse = CoarseSearch(threshold=args.blob_min_threshold)
+    elif not args.coarse_search:
+        coarse = None
+    if coarse is not None:
+        coarse.threshold = args.blob_min_threshold
+
+    if args.motion_gate and gate is None:
+        gate = MotionGate(noise=args.motion_gate_noise, max_skip=args.motion_gate_max_skip)
+    elif not args.motion_gate:
+        gate = None
+
+    if "verbose" in settings:
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+
+def control_handle(data):
+    try:
+        command = json.loads(data.decode("utf-8"))
+        cmd = command.pop("cmd", "status")
+        if cmd == "set":
+            control_set(command)
+        elif cmd != "status":
+            raise ValueError(f"unknown command: {cmd}")
+        reply = {"ok": True, **control_status()}
+    except (ValueError, TypeError, AttributeError) as err:
+        reply = {"ok": False, "error": str(err)}
+    except (RuntimeError, cv2.error) as err:
+        # the camera or OpenCV didn't like it, but keep the heartbeat going
+        logging.warning(f"{ctime()} - Control command failed: {err}")
+        reply = {"ok": False, "error": str(err)}
+    return json.dumps(reply).encode("utf-8")
 
 
 def heartbeat_run():
     while True:
         try:
-            data, addr = sock_heartbeat.recvfrom(48)
+            data, addr = sock_heartbeat.recvfrom(4096)
         except TimeoutError:
-            logging.info(f"{ctime()} - Waiting for a heartbeat from client...")
-            philnav_stop()
+            if args.timeout == 0:
+                logging.info(f"{ctime()} - Waiting for a heartbeat from client...")
+                philnav_stop()
+            if args.realtime:
+                gc_idle()
             continue
         else:
-            logging.info(f"{ctime()} - Received heartbeat from client.")
-            philnav_start()
+            # A command is JSON, a heartbeat is 6 packed doubles. Not by
+            # length: a command can happen to be 48 bytes too.
+            if data[:1] == b"{" or len(data) != 48:
+                logging.info(f"{ctime()} - Received command from {addr[0]}: {data}")
+                sock_heartbeat.sendto(control_handle(data), addr)
+                continue
+            if args.timeout == 0:
+                logging.info(f"{ctime()} - Received heartbeat from client.")
+                philnav_start()
 
 
 now = time()
@@ -218,15 +678,87 @@ class phil:
     frame_num = 0
     x = 0.0
     y = 0.0
+    frame_ms = 0.0
+    warmup_mean = 0.0
+    warmup_stable = 0
+    ready_notified = False
+    first_packet = False
+    adapting = False
+    lost = True  # no sticker in the last frame
+    realtime_applied = False
+    gc_at = perf
+    resumed = True  # set by philnav_start()
+    sent_at = perf
+    pending_x = 0.0  # --send-deadzone, movement held back
+    pending_y = 0.0
+    suppressed = 0  # total movements held back
+    suppressed_pending = 0  # since the last packet
+    keyframes = 0
     debug_num = 0
     keypoint = None  # for debugging inspection
 
 
+def send_movement(x_diff, y_diff, keyframe=False):
+    # Send the (x_diff, y_diff) to the receiving computer.
+    # For performance stats, I'm also sending the time spent on
+    # Raspberry Pi.
+    #
+    # 48 bytes of 6 doubles in binary C format. Why? Because it's
+    # OpenTrack's protocol.
+    # struct.pack('dddddd', x, y, z, pitch, yaw, roll)
+    # PhilNav uses x, y as x_diff, y_diff and moves the mouse
+    # relative to its current position. With --send-deadzone, z is the
+    # number of movements held back since the last packet and pitch is 1.0
+    # for a keyframe.
+    # https://github.com/opentrack/opentrack/issues/747
+    ms_time_spent = (perf_counter() - phil.frame_perf) * 1000
+    if args.transport == "absolute":
+        msg = absolute_pack(x_diff, y_diff, ms_time_spent, keyframe)
+    else:
+        msg = struct.pack(
+            "dddddd",
+            x_diff,
+            y_diff,
+            float(phil.suppressed_pending),
+            1.0 if keyframe else 0.0,
+            phil.frame_started_at,
+            ms_time_spent,
+        )
+    sock.sendto(msg, sock_addr)
+    phil.sent_at = perf_counter()
+    phil.pending_x = 0.0
+    phil.pending_y = 0.0
+    phil.suppressed_pending = 0
+    if keyframe:
+        phil.keyframes += 1
+    if not phil.first_packet:
+        phil.first_packet = True
+        startup.mark("first packet")
+        logging.info(f"{ctime()} - First packet {startup.elapsed_ms():.0f}ms after startup")
+
+
 # This is where the Magic happens! The camera should pick up nothing but a white
 # dot from your reflective IR sticker. I use opencv blob detection to track its
 # (x, y) coordinates and send the changes to the receiving computer, which moves
 # the mouse.
 def blobby(request):
+    # control_set() can swap or remove these from the heartbeat thread at any
+    # time, so look each one up once per frame
+    glare_mask, coarse_search, motion_gate, blob_detector = glare, coarse, gate, detector
+
+    # The camera calls this from its own thread, so that's the one to speed up
+    if args.realtime and not phil.realtime_applied:
+        phil.realtime_applied = True
+        applied = realtime_thread(args.realtime_priority, parse_cpus(args.realtime_cpus))
+        logging.info(f"{ctime()} - Realtime frame processing: {', '.join(applied) or 'not permitted'}")
+
+    # Time between the starts of this frame and the last one
+    ms_frame_interval = (perf_counter() - phil.frame_perf) * 1000
+    if phil.resumed:
+        # The first frame since the camera (re)started: the time since the
+        # last one is the whole pause, not a late frame
+        phil.resumed = False
+        ms_frame_interval = 1000 / args.fps
     phil.frame_perf = perf_counter()
     phil.frame_started_at = time()
     phil.frame_num += 1
@@ -236,8 +768,27 @@ def blobby(request):
 
     # MappedArray gives direct access to the captured camera frame
     with MappedArray(request, "main") as m:
+        if not camera_ready.is_set():
+            camera_warmup(m.array)
+
+        # Black out known reflections, so they're never detected as blobs
+        if glare_mask is not None:
+            glare_mask.update(m.array, (phil.x, phil.y))
+            glare_mask.apply(m.array)
+            if glare_mask.frames == glare_mask.warmup:
+                logging.info(
+                    f"{ctime()} - Glare mask learned, {glare_mask.coverage:.1%} of frame masked"
+                )
+
+        # Nothing has changed since the last detection, so skip it (and sending)
+        gated = (
+            motion_gate is not None
+            and camera_ready.is_set()
+            and motion_gate.unchanged(m.array, None if phil.lost else (phil.x, phil.y))
+        )
+
         # https://www.fypsolutions.com/opencv-python/findcontours-opencv-python-drawcontours-opencv-python/
-        if args.contours:
+        if args.contours and not gated:
             im_gray = cv2.cvtColor(m.array, cv2.COLOR_BGR2GRAY)
             _ret, thresh = cv2.threshold(im_gray, args.blob_min_threshold, 255, 0)
             contours, _hierarchy = cv2.findContours(
@@ -253,7 +804,14 @@ def blobby(request):
                     )
 
         # Track the IR sticker
-        keypoints = detector.detect(m.array)
+        if gated:
+            keypoints = ()
+        elif coarse_search is not None and phil.lost:
+            keypoints = coarse_search.detect(m.array, blob_detector)
+        else:
+            keypoints = blob_detector.detect(m.array)
+        if not gated:
+            phil.lost = len(keypoints) == 0
         if args.preview:
             # Draw red circles around the detected blobs, in-place on array
             cv2.drawKeypoints(
@@ -279,28 +837,32 @@ def blobby(request):
             # If the IR sticker has moved smoothly, but not "jumped"...
             # Jumping can occur if multiple blobs are detected, such as other
             # IR reflective surfaces in the camera's view, like glasses lenses.
-            if (x_diff**2 > 0 or y_diff**2 > 0) and x_diff**2 < 50 and y_diff**2 < 50:
-                # Send the (x_diff, y_diff) to the receiving computer.
-                # For performance stats, I'm also sending the time spent on
-                # Raspberry Pi.
-                #
-                # 48 bytes of 6 doubles in binary C format. Why? Because it's
-                # OpenTrack's protocol.
-                # struct.pack('dddddd', x, y, z, pitch, yaw, roll)
-                # PhilNav uses x, y as x_diff, y_diff and moves the mouse
-                # relative to its current position.
-                # https://github.com/opentrack/opentrack/issues/747
-                ms_time_spent = (perf_counter() - phil.frame_perf) * 1000
-                msg = struct.pack(
-                    "dddddd",
-                    x_diff,
-                    y_diff,
-                    0.0,
-                    0.0,
-                    phil.frame_started_at,
-                    ms_time_spent,
-                )
-                sock.sendto(msg, sock_addr)
+            if (
+                camera_ready.is_set()
+                and (x_diff**2 > 0 or y_diff**2 > 0)
+                and x_diff**2 < 50
+                and y_diff**2 < 50
+            ):
+                if args.send_deadzone > 0:
+                    # Hold small movements until they add up to something
+                    phil.pending_x += x_diff
+                    phil.pending_y += y_diff
+                    if math.hypot(phil.pending_x, phil.pending_y) < args.send_deadzone:
+                        phil.suppressed += 1
+                        phil.suppressed_pending += 1
+                    else:
+                        send_movement(phil.pending_x, phil.pending_y)
+                else:
+                    send_movement(x_diff, y_diff)
+
+        # Keyframe: if nothing was sent for a while, send whatever is held,
+        # so the client knows we're still here
+        if (
+            args.send_deadzone > 0
+            and camera_ready.is_set()
+            and perf_counter() - phil.sent_at > args.keyframe
+        ):
+            send_movement(phil.pending_x, phil.pending_y, keyframe=True)
 
         # Log once per second
         if args.verbose and (phil.frame_num % int(args.fps) == 0):
@@ -316,16 +878,57 @@ def blobby(request):
             logging.info(
                 f"{c_time} - {phil.frame_num:>8}, ({x_diff:> 8.2f}, {y_diff:> 8.2f})  , {int(fps_measured):>8}, {int(ms_measured):>8}, {int(ms_frame_between):>8}"
             )
+            if deadlines is not None and phil.debug_num % 5 == 1:
+                logging.info(
+                    f"{c_time} - Realtime: {deadlines.missed} frames over budget (worst {deadlines.worst_ms:.1f}ms), {late_frames.missed} frames late"
+                )
+            if args.send_deadzone > 0 and phil.debug_num % 5 == 1:
+                logging.info(
+                    f"{c_time} - Send deadzone: {phil.suppressed} movements held back, {phil.keyframes} keyframes"
+                )
+            if motion_gate is not None and phil.debug_num % 5 == 1:
+                logging.info(
+                    f"{c_time} - Motion gate skipped {motion_gate.skipped} of {phil.frame_num} frames ({motion_gate.skipped / phil.frame_num:.0%})"
+                )
 
         # Time between capturing frames from the camera.
         phil.frame_between = perf_counter()
-
+        phil.frame_ms = (phil.frame_between - phil.frame_perf) * 1000
+
+        if deadlines is not None:
+            deadlines.check(phil.frame_ms, 1000 / args.fps)
+            late_frames.check(ms_frame_interval, 1000 / args.fps * 1.5)
+            # Nothing to track right now, a good time to collect garbage
+            if (gated or phil.lost) and phil.frame_between - phil.gc_at > 5:
+                phil.gc_at = phil.frame_between
+                gc_idle()
+            else:
+                gc_tick()
+
+        # Switching sensor modes stops the camera, which waits for blobby()
+        # to return, so that happens in another thread.
+        if adaptive is not None and not phil.adapting:
+            level = adaptive.observe(phil.frame_ms, ms_frame_interval)
+            if level is not None:
+                phil.adapting = True
+                Thread(target=adaptive_apply, args=level, daemon=True).start()
+
+
+# --realtime: processing time over the frame budget, and frames arriving late
+deadlines = None
+late_frames = None
+if args.realtime:
+    deadlines = Deadlines()
+    late_frames = Deadlines()
+    if not lock_memory():
+        logging.info(f"{ctime()} - Realtime: not permitted to lock memory")
+    gc_steady()
 
 picam2.pre_callback = blobby
 
-if args.timeout == 0:
-    heartbeat_thread = Thread(target=heartbeat_run, daemon=True)
-    heartbeat_thread.start()
+# Heartbeats are ignored with --timeout, but runtime commands still work
+heartbeat_thread = Thread(target=heartbeat_run, daemon=True)
+heartbeat_thread.start()
 
 # Run the loop until Ctrl-C or timeout
 try:
@@ -337,5 +940,6 @@ try:
 except KeyboardInterrupt:
     pass
 
+startup.notify("STOPPING=1")
 philnav_stop()
 picam2.close()
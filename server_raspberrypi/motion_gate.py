@@ -0,0 +1,63 @@
+import cv2  # OpenCV, for comparing frames
+import numpy as np  # for preallocated buffers
+
+
+# Most of the time you're holding still (reading), and every frame looks the
+# same. Compare a few pixels with the last frame, and if nothing changed by
+# more than the camera's noise, skip blob detection entirely.
+#
+# While tracking, the pixels compared are a window around the sticker. While
+# it's lost, every 8th pixel of every 8th row. To be safe, a full detection
+# still runs at least every max_skip frames.
+class MotionGate:
+    def __init__(self, noise=10, max_skip=30, radius=16, step=8):
+        self.noise = noise  # brightness change that counts as motion
+        self.max_skip = max_skip
+        self.radius = radius  # window around the sticker
+        self.step = step  # sampling while lost
+        self.skipped = 0  # total frames skipped
+        self.skipped_in_row = 0
+        self.where = None  # what prev holds: a window origin, or "lost"
+        self.prev = None
+        self.cur = None
+        self.diff = None
+
+    def _signature(self, frame, marker):
+        h, w = frame.shape[:2]
+        size = 2 * self.radius
+        if marker is not None and w >= size and h >= size:
+            x0 = min(max(int(marker[0]) - self.radius, 0), w - size)
+            y0 = min(max(int(marker[1]) - self.radius, 0), h - size)
+            where = (x0, y0)
+            view = frame[y0 : y0 + size, x0 : x0 + size]
+        else:
+            where = ("lost", frame.shape)
+            view = frame[:: self.step, :: self.step]
+        # The IR image is grey, so one channel (green) will do
+        if view.ndim == 3:
+            view = view[:, :, 1]
+        return where, view
+
+    def unchanged(self, frame, marker=None):
+        """True if blob detection can be skipped for this frame"""
+        where, view = self._signature(frame, marker)
+        if self.cur is None or self.cur.shape != view.shape:
+            self.prev = np.zeros(view.shape, np.uint8)
+            self.cur = np.zeros(view.shape, np.uint8)
+            self.diff = np.zeros(view.shape, np.uint8)
+            self.where = None
+        np.copyto(self.cur, view)
+        same = False
+        if where == self.where and self.skipped_in_row < self.max_skip:
+            cv2.absdiff(self.cur, self.prev, dst=self.diff)
+            same = cv2.minMaxLoc(self.diff)[1] <= self.noise
+        if same:
+            self.skipped += 1
+            self.skipped_in_row += 1
+        else:
+            # Compare against the last frame that was detected, not just the
+            # last frame, so slow drift adds up until it counts as motion.
+            self.prev, self.cur = self.cur, self.prev
+            self.where = where
+            self.skipped_in_row = 0
+        return same
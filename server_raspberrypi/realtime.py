@@ -0,0 +1,128 @@
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+from time import perf_counter
+
+# --realtime: keep the hot loop from being interrupted by other programs, the
+# garbage collector, or memory being paged out. Everything here needs
+# privileges (root, or CAP_SYS_NICE and a memlock limit) and is Linux only, so
+# each step falls back quietly and reports what it managed to do.
+# Same as client_win-mac-nix/realtime.py.
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def parse_cpus(text):
+    """ "3" or "2,3" or "2-3" to a set of CPU numbers"""
+    cpus = set()
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def realtime_thread(priority=10, cpus=None):
+    """Call from the thread that should run in real time. Returns a list of
+    what worked, for logging."""
+    applied = []
+    try:
+        # pid 0 is the calling thread on Linux
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        applied.append(f"SCHED_FIFO priority {priority}")
+    except (AttributeError, OSError):
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, -10)
+            applied.append("nice -10")
+        except (AttributeError, OSError):
+            pass
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            applied.append(f"CPUs {','.join(str(c) for c in sorted(cpus))}")
+        except (AttributeError, OSError):
+            pass
+    return applied
+
+
+def lock_memory():
+    """Keep all memory, now and later, in RAM"""
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return False
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        return libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+GC_YOUNG_EVERY = 1.0  # seconds between gc_tick() collections
+GC_FULL_EVERY = 60.0  # seconds without gc_idle() before gc_tick() does it
+
+gc_young_at = perf_counter()
+gc_full_at = perf_counter()
+
+
+def gc_steady():
+    """Call once started up. Everything allocated so far is never collected,
+    and from now on the garbage collector only runs from gc_idle() and
+    gc_tick()."""
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+
+
+def gc_idle():
+    """Call when there's nothing else to do"""
+    global gc_full_at, gc_young_at
+    gc.collect()
+    gc_full_at = gc_young_at = perf_counter()
+
+
+def gc_tick():
+    """Call after each frame or packet is handled. Idle moments can be rare
+    (tracking without a break), so collect the young generations once a
+    second, which is cheap, and everything once a minute without gc_idle().
+    Otherwise, with memory locked, garbage would pile up for good."""
+    global gc_full_at, gc_young_at
+    now = perf_counter()
+    if now - gc_full_at > GC_FULL_EVERY:
+        gc_idle()
+    elif now - gc_young_at > GC_YOUNG_EVERY:
+        gc.collect(1)
+        gc_young_at = now
+
+
+def realtime_start(priority=10, cpus=None):
+    applied = realtime_thread(priority, cpus)
+    if lock_memory():
+        applied.append("memory locked")
+    gc_steady()
+    applied.append("garbage collection when idle")
+    logging.info(f"Realtime: {', '.join(applied)}")
+    if not any(a.startswith("SCHED_FIFO") for a in applied):
+        print("Realtime: not permitted to use real-time scheduling, run as root for --realtime\n")
+    return applied
+
+
+class Deadlines:
+    """Counts how often work took longer than it should have"""
+
+    def __init__(self):
+        self.checked = 0
+        self.missed = 0
+        self.worst_ms = 0.0
+
+    def check(self, ms, budget_ms):
+        self.checked += 1
+        if ms > budget_ms:
+            self.missed += 1
+            self.worst_ms = max(self.worst_ms, ms)
+            return False
+        return True
@@ -0,0 +1,64 @@
+import os
+import socket
+from time import perf_counter
+
+# Startup instrumentation and systemd integration. PhilNav is started at boot
+# and restarted after crashes, so the time until the first mouse packet is
+# what the user actually waits for.
+
+started_at = perf_counter()
+phases = []  # (name, ms since start)
+
+
+def mark(name):
+    phases.append((name, (perf_counter() - started_at) * 1000))
+
+
+def elapsed_ms():
+    return (perf_counter() - started_at) * 1000
+
+
+def summary():
+    # eg. "import picamera2 412ms, camera configure 180ms (592ms), ..."
+    parts = []
+    last = 0.0
+    for name, ms in phases:
+        parts.append(f"{name} {ms - last:.0f}ms ({ms:.0f}ms)")
+        last = ms
+    return ", ".join(parts)
+
+
+def as_dict():
+    return {name: round(ms, 1) for name, ms in phases}
+
+
+# https://www.freedesktop.org/software/systemd/man/latest/sd_notify.html
+# Type=notify services tell systemd when they are actually ready, instead of
+# systemd assuming the service is ready as soon as the process starts.
+def notify(state):
+    path = os.environ.get("NOTIFY_SOCKET")
+    if not path:
+        return False
+    if path.startswith("@"):  # abstract namespace
+        path = "\0" + path[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(path)
+            sock.sendall(state.encode("utf-8"))
+    except OSError:
+        return False
+    return True
+
+
+# https://www.freedesktop.org/software/systemd/man/latest/sd_listen_fds.html
+# With socket activation, systemd holds the heartbeat port open across
+# restarts, so heartbeats sent while PhilNav restarts aren't lost.
+SD_LISTEN_FDS_START = 3
+
+
+def listen_socket():
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+    if int(os.environ.get("LISTEN_FDS", "0")) < 1:
+        return None
+    return socket.socket(fileno=SD_LISTEN_FDS_START)
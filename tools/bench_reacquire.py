@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+# How long does it take to find the IR sticker again after it was lost, at
+# different resolutions? Compares a full frame detector.detect() with the
+# server's --coarse-search. Runs on any PC:
+#
+#   python3 tools/bench_reacquire.py
+#
+# "found" is a frame with the sticker somewhere in it, "empty" is a frame
+# without it (eg. you turned away), which is what the server sees most while
+# the sticker is lost.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "server_raspberrypi"))
+from coarse_search import CoarseSearch  # noqa: E402
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--sizes", type=str, nargs="+", default=["320x240", "640x480", "1280x720", "1920x1080"], help="resolutions to try, default 320x240 640x480 1280x720 1920x1080"
+)
+parser.add_argument(
+    "--repeat", type=int, default=200, help="frames per measurement, default 200"
+)
+parser.add_argument(
+    "--blob-size", type=int, default=15, help="OpenCV blob minimum size, default 15"
+)
+parser.add_argument(
+    "--blob-min-threshold", type=int, default=200, help="Blob must be this bright to detect, default 200"
+)
+args = parser.parse_args()
+
+
+# Same as detector_create() in server_raspberrypi/main.py
+params = cv2.SimpleBlobDetector_Params()
+params.filterByArea = True
+params.minArea = args.blob_size
+params.filterByColor = True
+params.blobColor = 255
+params.minThreshold = args.blob_min_threshold
+params.maxThreshold = 255
+params.thresholdStep = 50
+params.minRepeatability = 2
+params.minDistBetweenBlobs = 100
+params.filterByCircularity = False
+params.filterByConvexity = False
+params.filterByInertia = False
+detector = cv2.SimpleBlobDetector_create(params)
+
+
+def frames(width, height):
+    # XBGR8888 like the camera, with a little noise. The sticker is about the
+    # same size in pixels at any resolution (it's small anyway).
+    rng = np.random.default_rng(0)
+    empty = rng.integers(0, 40, (height, width, 4), np.uint8)
+    found = empty.copy()
+    cv2.circle(found, (width * 2 // 3, height // 3), 6, (255, 255, 255, 255), -1)
+    return found, empty
+
+
+def time_ms(fn, frame):
+    fn(frame)  # warm up
+    start = perf_counter()
+    for _ in range(args.repeat):
+        keypoints = fn(frame)
+    return (perf_counter() - start) * 1000 / args.repeat, len(keypoints)
+
+
+print(f"{'size':>10}, {'full found':>10}, {'coarse found':>12}, {'full empty':>10}, {'coarse empty':>12}, {'speedup':>8}")
+for size in args.sizes:
+    width, height = (int(v) for v in size.split("x"))
+    found, empty = frames(width, height)
+    coarse = CoarseSearch(threshold=args.blob_min_threshold)
+
+    full_found, n_full = time_ms(detector.detect, found)
+    coarse_found, n_coarse = time_ms(lambda f: coarse.detect(f, detector), found)
+    full_empty, _ = time_ms(detector.detect, empty)
+    coarse_empty, _ = time_ms(lambda f: coarse.detect(f, detector), empty)
+    check = "" if n_full == n_coarse else f"  (keypoints differ: {n_full} vs {n_coarse})"
+    print(
+        f"{size:>10}, {full_found:>8.2f}ms, {coarse_found:>10.2f}ms, {full_empty:>8.2f}ms, {coarse_empty:>10.2f}ms, {full_found / coarse_found:>7.1f}x{check}"
+    )
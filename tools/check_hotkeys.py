@@ -0,0 +1,134 @@
+import errno
+import os
+import struct
+import sys
+import tempfile
+from collections import namedtuple
+
+# Checks the Linux hotkey engine (client_win-mac-nix/hotkey_nix_uinput.py)
+# without a keyboard or root. Devices are faked with pipes in a temporary
+# "/dev/input", so hot-add, unplugging and key combos can be played back:
+#
+#   python3 tools/check_hotkeys.py
+#
+# Needs evdev (pip install evdev) for the key codes, and Linux for epoll and
+# inotify.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "client_win-mac-nix"))
+from evdev import ecodes  # noqa: E402
+from hotkey_nix_uinput import HotkeyEngine  # noqa: E402
+
+EVENT = struct.Struct("HHi")  # type, code, value
+InputEvent = namedtuple("InputEvent", "type code value")
+
+
+class FakeDevice:
+    """Looks enough like evdev.InputDevice for HotkeyEngine. Events written
+    to the pipe come out of read(); closing the write end is unplugging."""
+
+    def __init__(self, path, read_fd):
+        self.path = path
+        self.fd = read_fd
+        os.set_blocking(read_fd, False)
+
+    def capabilities(self):
+        return {ecodes.EV_KEY: [ecodes.KEY_LEFTSHIFT, ecodes.KEY_F7, ecodes.KEY_F8]}
+
+    def read(self):
+        data = os.read(self.fd, 4096)  # BlockingIOError if there's nothing
+        if not data:
+            raise OSError(errno.ENODEV, "No such device")
+        return [
+            InputEvent(*EVENT.unpack_from(data, offset))
+            for offset in range(0, len(data) - EVENT.size + 1, EVENT.size)
+        ]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FakeKeyboards:
+    """Plug fake keyboards into a directory, and type on them"""
+
+    def __init__(self, input_dir):
+        self.input_dir = input_dir
+        self.read_fds = {}  # path: read end, handed to open_device
+        self.write_fds = {}  # path: write end
+
+    def plug(self, name):
+        path = os.path.join(self.input_dir, name)
+        self.read_fds[path], self.write_fds[path] = os.pipe()
+        open(path, "w").close()  # inotify sees the new device
+        return path
+
+    def open_device(self, path):
+        if path not in self.read_fds:
+            raise PermissionError(path)
+        return FakeDevice(path, self.read_fds.pop(path))
+
+    def type(self, path, *keys):
+        # press the keys in order, then release them in reverse
+        events = [(ecodes.EV_KEY, key, 1) for key in keys]
+        events += [(ecodes.EV_KEY, key, 0) for key in reversed(keys)]
+        os.write(self.write_fds[path], b"".join(EVENT.pack(*e) for e in events))
+
+    def unplug(self, path):
+        os.close(self.write_fds.pop(path))
+
+    def remove(self, path):
+        os.remove(path)
+
+
+def process_all(engine):
+    # a few rounds, a hot-added device needs one to be added and one to read
+    for _ in range(5):
+        engine.process(timeout=0.05)
+
+
+def check(name, ok):
+    print(f"{'ok' if ok else 'FAIL':>4}  {name}")
+    return ok
+
+
+fired = []
+results = []
+with tempfile.TemporaryDirectory() as input_dir:
+    keyboards = FakeKeyboards(input_dir)
+    first = keyboards.plug("event0")
+    engine = HotkeyEngine(
+        [("shift+f7", lambda: fired.append("toggle")), ("shift+f8", lambda: fired.append("multiplier"))],
+        debounce=0.0,
+        input_dir=input_dir,
+        open_device=keyboards.open_device,
+    )
+    engine.scan()
+    results.append(check("device found at startup", first in engine.paths))
+
+    keyboards.type(first, ecodes.KEY_LEFTSHIFT, ecodes.KEY_F7)
+    process_all(engine)
+    results.append(check("shift+f7 fires toggle", fired == ["toggle"]))
+
+    keyboards.type(first, ecodes.KEY_F7)
+    process_all(engine)
+    results.append(check("f7 without shift doesn't fire", fired == ["toggle"]))
+
+    second = keyboards.plug("event1")
+    process_all(engine)
+    results.append(check("keyboard plugged in later is added", second in engine.paths))
+
+    keyboards.type(second, ecodes.KEY_LEFTSHIFT, ecodes.KEY_F8)
+    process_all(engine)
+    results.append(check("shift+f8 on it fires multiplier", fired == ["toggle", "multiplier"]))
+
+    keyboards.unplug(second)
+    process_all(engine)
+    results.append(check("unplugged keyboard is removed", second not in engine.paths))
+
+    keyboards.remove(first)
+    process_all(engine)
+    results.append(check("deleted device node is removed", first not in engine.paths))
+
+    engine.close()
+
+sys.exit(0 if all(results) else 1)
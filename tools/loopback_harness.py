@@ -0,0 +1,170 @@
+import argparse
+import math
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+from time import sleep
+
+# End-to-end loopback latency harness. Runs the real server (with
+# --fake-camera, a synthetic moving dot) and the real client (with
+# --mouse null, which only records the cursor moves) on this PC, talking over
+# loopback UDP. No Raspberry Pi, camera or desktop session needed, so it runs
+# in CI on plain Linux (pip install opencv-python-headless numpy).
+#
+#   python3 tools/loopback_harness.py
+#   python3 tools/loopback_harness.py --fps 60 120 240 --duration 5 --max-p99 20
+#   python3 tools/loopback_harness.py --server-args="--contours --motion-gate"
+#
+# For each frame rate it reports:
+#   latency: frame capture -> cursor moved, in ms (p50/p90/p99/max)
+#   rate:    cursor moves per second, vs. the camera's frame rate
+#   error:   RMS distance between the cursor path and the dot's true path, in
+#            camera pixels, after lining them up
+#
+# The client logs each move with its frame's capture time (time_cam from the
+# server), and on loopback both use the same clock, so latency is measured
+# directly. The dot's true path at that capture time is
+# fake_camera.trajectory(), which gives the path error.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "server_raspberrypi"))
+from fake_camera import trajectory  # noqa: E402
+
+SERVER = os.path.join(ROOT, "server_raspberrypi", "main.py")
+CLIENT = os.path.join(ROOT, "client_win-mac-nix", "main.py")
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--fps", type=float, nargs="+", default=[60, 90, 120, 180, 240, 360], help="camera frame rates to try, default 60 90 120 180 240 360"
+)
+parser.add_argument(
+    "--duration", type=int, default=5, help="seconds per frame rate, default 5"
+)
+parser.add_argument(
+    "--width", type=int, default=320, help="camera resolution width, default 320"
+)
+parser.add_argument(
+    "--height", type=int, default=240, help="camera resolution height, default 240"
+)
+parser.add_argument(
+    "--port", type=int, default=14245, help="loopback port, default 14245 (and port+1 for heartbeats)"
+)
+parser.add_argument(
+    "--cursor-speed", type=float, default=100.0, help="client --x-speed/--y-speed, high enough that rounding doesn't matter, default 100"
+)
+parser.add_argument(
+    "--server-args", type=str, default="", help="extra arguments for the server, eg. --server-args=\"--contours --motion-gate\" (with =, so they aren't taken as the harness's own)"
+)
+parser.add_argument(
+    "--client-args", type=str, default="", help="extra arguments for the client, eg. --client-args=--realtime"
+)
+parser.add_argument(
+    "--max-p99", type=float, default=0, help="exit with an error if p99 latency is above N ms at any frame rate that keeps up, for CI. Default off"
+)
+args = parser.parse_args()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return math.nan
+    i = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[i]
+
+
+def analyse(moves, fps, speed):
+    # Skip the first second, the camera is warming up and the client filling
+    # its smoothing queues.
+    t_start = moves[0][0] + 1.0
+    moves = [m for m in moves if m[0] >= t_start]
+    if len(moves) < 10:
+        return None
+
+    latencies = [(t - time_cam) * 1000 for t, _x, _y, time_cam in moves]
+
+    # The cursor starts at 0, 0 wherever the dot was first seen, so line up
+    # the two paths by their median offset.
+    s = args.cursor_speed
+    x_offsets = []
+    y_offsets = []
+    for _t, x, y, time_cam in moves:
+        tx, ty = trajectory(time_cam, args.width, args.height, speed)
+        x_offsets.append(tx - x / s)
+        y_offsets.append(ty - y / s)
+    x0 = percentile(x_offsets, 50)
+    y0 = percentile(y_offsets, 50)
+    err = math.sqrt(
+        sum((xo - x0) ** 2 + (yo - y0) ** 2 for xo, yo in zip(x_offsets, y_offsets))
+        / len(moves)
+    )
+
+    rate = (len(moves) - 1) / (moves[-1][0] - moves[0][0])
+    return {
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "rate": rate,
+        "error": err,
+    }
+
+
+def run(fps):
+    # about 1.5 px per frame, so the client's smoothing tiers stay out of
+    # the way (they're for slow, precise movements)
+    speed = fps * 1.5
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "moves.txt")
+        env = dict(os.environ, PHILNAV_MOUSE_LOG=log)
+        client = subprocess.Popen(
+            [sys.executable, CLIENT, "--mouse", "null",
+             "--port", str(args.port), "--bind-ip", "127.0.0.1",
+             "--client-ip", "127.0.0.1", "--server-ip", "127.0.0.1",
+             "--smooth", "1", "--deadzone", "0",
+             "--x-speed", str(args.cursor_speed), "--y-speed", str(args.cursor_speed),
+             "--timeout", str(args.duration + 3)] + shlex.split(args.client_args),
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        sleep(0.5)  # let the client bind first
+        server = subprocess.Popen(
+            [sys.executable, SERVER, "--fake-camera",
+             "--fake-camera-speed", str(speed),
+             "--ip", "127.0.0.1", "--port", str(args.port), "--fps", str(fps),
+             "--width", str(args.width), "--height", str(args.height),
+             "--timeout", str(args.duration)] + shlex.split(args.server_args),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        server.wait()
+        client.wait()
+        if not os.path.exists(log):
+            return None
+        with open(log) as f:
+            moves = [tuple(float(v) for v in line.split()) for line in f if line.strip()]
+    if not moves:
+        return None
+    return analyse(moves, fps, speed)
+
+
+print(f"{'fps':>8}, {'rate':>8}, {'p50 ms':>8}, {'p90 ms':>8}, {'p99 ms':>8}, {'max ms':>8}, {'error px':>8}")
+failed = False
+ceiling = None
+for fps in args.fps:
+    result = run(fps)
+    if result is None:
+        print(f"{fps:>8.0f}, no cursor moves recorded")
+        failed = True
+        continue
+    keeps_up = result["rate"] >= fps * 0.95
+    if keeps_up:
+        ceiling = fps
+        if args.max_p99 and result["p99"] > args.max_p99:
+            failed = True
+    print(
+        f"{fps:>8.0f}, {result['rate']:>8.1f}, {result['p50']:>8.2f}, {result['p90']:>8.2f}, {result['p99']:>8.2f}, {result['max']:>8.2f}, {result['error']:>8.3f}"
+        + ("" if keeps_up else "  (can't keep up)")
+    )
+
+print(f"\nThroughput ceiling: {ceiling if ceiling else 'none'} fps")
+sys.exit(1 if failed else 0)